@@ -2,6 +2,7 @@ from app.db.manager import dbmanager
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.security import verify_token
+from app.core.config import ADMIN_UIDS
 from app.schemas.models import JWTPayload
 
 token_auth_scheme = HTTPBearer()
@@ -16,6 +17,14 @@ async def verify_jwt(token: HTTPAuthorizationCredentials = Depends(token_auth_sc
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def require_admin(user: JWTPayload = Depends(verify_jwt)) -> JWTPayload:
+    """
+    Dependency restricting an endpoint to the users listed in ADMIN_UIDS.
+    """
+    if user.sub not in ADMIN_UIDS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 async def get_db():
     """
     Dependency to get the database manager.
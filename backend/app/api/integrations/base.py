@@ -1,7 +1,16 @@
+import httpx
 from abc import ABC, abstractmethod
+from .transport import get_http_client
 
 class OAuthProvider(ABC):
 
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """
+        Shared, pooled HTTP client for requests to the provider.
+        """
+        return get_http_client()
+
     @abstractmethod
     async def exchange_code(self, code: str) -> dict:
         """
@@ -10,7 +19,7 @@ class OAuthProvider(ABC):
         pass
 
     @abstractmethod
-    def verify_identity(self, tokens: dict) -> str:
+    async def verify_identity(self, tokens: dict) -> str:
         """
         Returns the third-part User ID from the tokens
         """
@@ -1,10 +1,19 @@
 import os
+import re
 import json
+import time
+import base64
+import asyncio
+from datetime import datetime, timezone
 from uuid import UUID
 
 from app.core.logger import logger
-from app.core.config import SECRETS_DIR, GCAL_SECRETS_FILENAME
+from app.core.redis import redis_client
+from app.core.config import GOOGLE_TOKEN_REFRESH_SKEW
 from .base import OAuthProvider
+from .transport import get_google_client_config, get_http_client
+
+from fastapi import HTTPException
 
 from google.auth.transport import requests as google_requests
 from google.auth.transport.requests import Request
@@ -13,20 +22,22 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.oauth2 import id_token
-
-import httpx
+from google.auth import jwt as google_jwt
 
 GOOGLE_SCOPES = [
     'https://www.googleapis.com/auth/calendar.readonly',
     'https://www.googleapis.com/auth/calendar.events',
 ]
 
+GOOGLE_TOKEN_URI = "https://oauth2.googleapis.com/token"
+GOOGLE_CERTS_URI = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
 class GoogleProvider(OAuthProvider):
 
     async def exchange_code(self, code: str):
 
-        google_secrets = get_google_secrets()
-        client_config = google_secrets.get("web") or google_secrets.get("installed", {})
+        client_config = get_google_client_config()
         google_client_id = client_config.get("client_id")
         google_client_secret = client_config.get("client_secret")
 
@@ -38,26 +49,23 @@ class GoogleProvider(OAuthProvider):
             "redirect_uri": "",
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data=token_data
-            )
+        response = await self.http.post(
+            GOOGLE_TOKEN_URI,
+            data=token_data
+        )
 
         if response.status_code != 200:
-
-            print(f"Google Exchange Failed: {response.text}")
+            logger.error("google_code_exchange_failed", status=response.status_code, body=response.text)
             raise HTTPException(status_code=401, detail="Invalid Google auth code.")
 
         return response.json()
     
-    def verify_identity(self, tokens: dict) -> str:
+    async def verify_identity(self, tokens: dict) -> str:
         struct_logger = logger.bind(provider="google")
         try:
-            user_info = id_token.verify_oauth2_token(
+            user_info = await verify_google_id_token(
                 tokens["id_token"],
-                google_requests.Request(),
-                (get_google_secrets().get("web") or get_google_secrets().get("installed", {})).get("client_id")
+                get_google_client_config().get("client_id")
             )
             struct_logger.info("google_identity_verified", provider_user_id=user_info.get("sub"))
             return user_info
@@ -66,50 +74,223 @@ class GoogleProvider(OAuthProvider):
             raise HTTPException(status_code=401, detail="Invalid Google auth token.")
 
     async def revoke(self, refresh_token: str) -> bool:
-        async with httpx.AsyncClient() as client:
-            response: Response = await client.post(
-                "https://oauth2.googleapis.com/revoke",
-                params={"token": refresh_token}
-            )
+        response = await self.http.post(
+            "https://oauth2.googleapis.com/revoke",
+            params={"token": refresh_token}
+        )
 
-            if response.status_code != 200:
-                return False
+        if response.status_code != 200:
+            return False
         return True
 
     def provider(self) -> str:
         return "google"
-        
 
-def get_google_secrets() -> dict:
-    
-    # Check docker path first since that's where the volume is mounted, fall back to local relative path
-    secrets_path = os.path.join(SECRETS_DIR, GCAL_SECRETS_FILENAME)
-    
-    if not os.path.exists(secrets_path):
-        # Fallback for local, out-of-container development without a complete .env
-        secrets_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "secrets", GCAL_SECRETS_FILENAME)
-            
-    with open(secrets_path, 'r') as f:
-        return json.loads(f.read())
 
-async def get_gcal_creds(uid: UUID):
-    from app.db.manager import dbmanager
-    struct_logger = logger.bind(provider="google", user_id=str(uid))
-    
-    integration = await dbmanager.get_user_integration(uid=uid, provider="google")
-    if not integration or not integration.access_token:
-        struct_logger.warn("google_credentials_not_found_in_db")
+
+class GoogleCertCache:
+    """
+    Google's ID-token signing certificates, cached for as long as Google's Cache-Control allows.
+
+    Certificates are kept in-process and shared across workers through Redis, so a burst of
+    logins triggers at most one outbound fetch per expiry window.
+    """
+    REDIS_KEY = "google_oauth2_certs"
+    # Minimum seconds between forced fetches for an unknown key id
+    FORCED_REFRESH_INTERVAL = 60
+
+    def __init__(self):
+        self._certs: dict | None = None
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, force_refresh: bool=False) -> dict:
+        if not force_refresh and self._certs and time.monotonic() < self._expires_at:
+            return self._certs
+
+        async with self._lock:
+            now = time.monotonic()
+            if force_refresh and now - self._fetched_at < self.FORCED_REFRESH_INTERVAL:
+                return self._certs or {}
+            if not force_refresh and self._certs and now < self._expires_at:
+                return self._certs
+
+            if not force_refresh:
+                try:
+                    pipe = redis_client.pipeline()
+                    pipe.get(self.REDIS_KEY)
+                    pipe.ttl(self.REDIS_KEY)
+                    raw, ttl = await pipe.execute()
+                    if raw and ttl > 0:
+                        self._certs, self._expires_at = json.loads(raw), now + ttl
+                        return self._certs
+                except Exception as e:
+                    logger.warn("google_certs_redis_read_failed", error=str(e))
+
+            response = await get_http_client().get(GOOGLE_CERTS_URI)
+            response.raise_for_status()
+            certs = response.json()
+
+            match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+            max_age = int(match.group(1)) if match else 3600
+
+            self._certs, self._expires_at, self._fetched_at = certs, now + max_age, now
+            try:
+                await redis_client.set(self.REDIS_KEY, json.dumps(certs), ex=max_age)
+            except Exception as e:
+                logger.warn("google_certs_redis_write_failed", error=str(e))
+            logger.info("google_certs_fetched", max_age=max_age)
+            return certs
+
+
+google_cert_cache = GoogleCertCache()
+
+def _token_key_id(token: str) -> str | None:
+    header = token.split(".", 1)[0]
+    try:
+        return json.loads(base64.urlsafe_b64decode(header + "=" * (-len(header) % 4))).get("kid")
+    except Exception:
         return None
 
-    struct_logger.info("google_credentials_fetched_from_db")
-    secrets = get_google_secrets()
-    client_config = secrets.get("web") or secrets.get("installed", {})
-    
-    return Credentials(
-        token=integration.access_token,
-        refresh_token=integration.refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=client_config.get("client_id"),
-        client_secret=client_config.get("client_secret"),
-        scopes=GOOGLE_SCOPES
-    )
\ No newline at end of file
+async def verify_google_id_token(token: str, audience: str) -> dict:
+    """
+    Verifies a Google ID token's signature, audience, expiry and issuer against the cached certificates.
+    Raises ValueError if the token is invalid.
+    """
+    certs = await google_cert_cache.get()
+    if _token_key_id(token) not in certs:
+        # Google may have rotated its keys since the certificates were cached
+        certs = await google_cert_cache.get(force_refresh=True)
+
+    id_info = google_jwt.decode(token, certs=certs, audience=audience, clock_skew_in_seconds=10)
+    if id_info.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer: {id_info.get('iss')}")
+    return id_info
+
+
+class GoogleTokenManager:
+    """
+    Keeps users' Google access tokens fresh.
+
+    Tokens are refreshed proactively once they are within GOOGLE_TOKEN_REFRESH_SKEW seconds of expiry,
+    and the result is written back to the database so no worker pays for a hidden refresh inside
+    googleapiclient. Concurrent refreshes for the same user collapse into one: in-process through a
+    shared task, and across workers through a Redis lock (the waiting worker re-reads the database).
+    """
+    def __init__(self, refresh_skew: int=GOOGLE_TOKEN_REFRESH_SKEW):
+        self.refresh_skew = refresh_skew
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def _needs_refresh(self, integration) -> bool:
+        return bool(integration.refresh_token) and integration.expires_at - self.refresh_skew <= time.time()
+
+    async def get_credentials(self, uid: UUID) -> Credentials | None:
+        from app.db.manager import dbmanager, Integration
+        struct_logger = logger.bind(provider="google", user_id=str(uid))
+
+        integration = await dbmanager.get_user_integration(uid=uid, provider="google")
+        if not isinstance(integration, Integration) or not integration.access_token:
+            struct_logger.warn("google_credentials_not_found_in_db")
+            return None
+
+        struct_logger.info("google_credentials_fetched_from_db")
+        if self._needs_refresh(integration):
+            integration = await self._refresh_single_flight(str(uid), integration)
+
+        client_config = get_google_client_config()
+
+        return Credentials(
+            token=integration.access_token,
+            refresh_token=integration.refresh_token,
+            token_uri=GOOGLE_TOKEN_URI,
+            client_id=client_config.get("client_id"),
+            client_secret=client_config.get("client_secret"),
+            scopes=GOOGLE_SCOPES,
+            # google-auth compares against naive UTC datetimes
+            expiry=datetime.fromtimestamp(integration.expires_at, tz=timezone.utc).replace(tzinfo=None) if integration.expires_at else None
+        )
+
+    async def _refresh_single_flight(self, uid: str, integration):
+        task = self._inflight.get(uid)
+        if task is None:
+            task = asyncio.create_task(self._refresh(uid, integration))
+            self._inflight[uid] = task
+            task.add_done_callback(lambda _: self._inflight.pop(uid, None))
+        # Shield so one cancelled caller does not abort the refresh for the others
+        return await asyncio.shield(task)
+
+    async def _refresh(self, uid: str, integration):
+        from app.db.manager import dbmanager, Integration
+        struct_logger = logger.bind(provider="google", user_id=uid)
+
+        lock = redis_client.lock(f"lock:google_token_refresh:{uid}", timeout=30, blocking_timeout=15)
+        try:
+            acquired = await lock.acquire()
+        except Exception as e:
+            struct_logger.warn("google_token_refresh_lock_failed", error=str(e))
+            acquired = False
+
+        try:
+            # Another worker may have refreshed while we waited for the lock
+            current = await dbmanager.get_user_integration(uid=uid, provider="google", fresh=True)
+            if isinstance(current, Integration):
+                integration = current
+                if not self._needs_refresh(integration):
+                    struct_logger.debug("google_token_refreshed_elsewhere")
+                    return integration
+            if not acquired:
+                return integration
+
+            tokens = await self._request_refresh(integration.refresh_token)
+            if not tokens:
+                return integration
+
+            tokens.setdefault("refresh_token", integration.refresh_token)
+            await dbmanager.update_user_integration(
+                uid=uid,
+                provider="google",
+                provider_user_id=integration.integration_user_id,
+                tokens=tokens
+            )
+            struct_logger.info("google_token_refreshed")
+            return Integration(
+                integration_user_id=integration.integration_user_id,
+                refresh_token=tokens["refresh_token"],
+                access_token=tokens["access_token"],
+                expires_at=tokens["expires_at"]
+            )
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except Exception as e:
+                    struct_logger.warn("google_token_refresh_lock_release_failed", error=str(e))
+
+    async def _request_refresh(self, refresh_token: str) -> dict | None:
+        client_config = get_google_client_config()
+
+        response = await get_http_client().post(
+            GOOGLE_TOKEN_URI,
+            data={
+                "client_id": client_config.get("client_id"),
+                "client_secret": client_config.get("client_secret"),
+                "refresh_token": refresh_token,
+                "grant_type": "refresh_token",
+            }
+        )
+
+        if response.status_code != 200:
+            logger.error("google_token_refresh_failed", status=response.status_code, body=response.text)
+            return None
+
+        tokens = response.json()
+        tokens["expires_at"] = int(time.time()) + int(tokens.get("expires_in", 3600))
+        return tokens
+
+
+google_token_manager = GoogleTokenManager()
+
+
+async def get_gcal_creds(uid: UUID):
+    return await google_token_manager.get_credentials(uid)
@@ -5,7 +5,7 @@ class TodoistProvider(OAuthProvider):
     async def exchange_code(self, code: str):
         pass
 
-    def verify_identity(self, tokens: dict) -> str:
+    async def verify_identity(self, tokens: dict) -> str:
         pass
 
     async def revoke(self, refresh_token: str) -> bool:
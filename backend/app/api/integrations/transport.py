@@ -0,0 +1,71 @@
+import os
+import json
+import httpx
+from app.core.logger import logger
+from app.core.config import SECRETS_DIR, GCAL_SECRETS_FILENAME
+
+# ----- CLIENT SECRETS -----
+
+# path -> (mtime, parsed secrets)
+_secrets_cache: dict[str, tuple[float, dict]] = {}
+
+def _google_secrets_path() -> str:
+    # Check docker path first since that's where the volume is mounted, fall back to local relative path
+    secrets_path = os.path.join(SECRETS_DIR, GCAL_SECRETS_FILENAME)
+
+    if not os.path.exists(secrets_path):
+        # Fallback for local, out-of-container development without a complete .env
+        secrets_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "secrets", GCAL_SECRETS_FILENAME)
+    return secrets_path
+
+def get_google_secrets() -> dict:
+    """
+    Returns the parsed Google client secrets.
+    The file is parsed once and re-read only when its modification time changes (e.g. rotated secrets).
+    """
+    secrets_path = _google_secrets_path()
+    mtime = os.stat(secrets_path).st_mtime
+
+    cached = _secrets_cache.get(secrets_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(secrets_path, 'r') as f:
+        secrets = json.loads(f.read())
+    _secrets_cache[secrets_path] = (mtime, secrets)
+    logger.info("google_secrets_loaded", path=secrets_path)
+    return secrets
+
+def get_google_client_config() -> dict:
+    secrets = get_google_secrets()
+    return secrets.get("web") or secrets.get("installed", {})
+
+# ----- HTTP CLIENT -----
+
+_http_client: httpx.AsyncClient | None = None
+
+def _create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(10.0),
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60),
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide pooled HTTP client used for all provider requests,
+    so TLS sessions and HTTP/2 connections are reused across requests.
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _create_http_client()
+    return _http_client
+
+async def init_http_client():
+    get_http_client()
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
@@ -1,16 +1,20 @@
 import os
 import shutil
+import mimetypes
 from typing import Union
 from fastapi import HTTPException
 from fastapi.concurrency import run_in_threadpool
 from pydantic import ValidationError
+from google.genai.errors import APIError
 import structlog
 from app.core.logger import logger
-from app.core.config import UPLOAD_DIR, APP_IDENTIFIER
+from app.core.config import UPLOAD_DIR, APP_IDENTIFIER, LLM_STREAM_RESPONSES
 from app.core.socket import sio
 from app.core.redis import redis_client
 from app.db.manager import dbmanager
 from app.services.firebase import generate_notification
+from app.services.ingestion import persist_upload, enqueue_ingestion
+from app.services.vdb import is_ingestible
 from app.schemas.enums import MessageType
 from app.schemas.models import SendMessageRequest
 
@@ -72,41 +76,99 @@ async def notify(uid: str, response: dict, db=dbmanager):
     except Exception as e:
         logger.error("notification_failed", error=str(e), uid=uid)
 
-async def process_llm_request(req: SendMessageRequest, uid: str, db=dbmanager, llm_client=None):
+def stream_to_user(uid: str):
+    """
+    Returns a chunk callback that forwards partial LLM output to the user's room.
+    Emits go through the Redis backplane, so the user receives them on whichever worker they are connected to.
+    """
+    async def on_chunk(text: str):
+        try:
+            chunk = {
+                'message': text,
+                'type': MessageType.Assistant
+            }
+            await sio.emit('llm_response_chunk', {"response": chunk}, room=uid)
+        except Exception as e:
+            logger.warn("llm_response_chunk_emit_failed", error=str(e), uid=uid)
+    return on_chunk
+
+async def process_llm_request(req: SendMessageRequest, uid: str, db=dbmanager, llm_client=None, stream: bool=LLM_STREAM_RESPONSES):
     """
     Prepares user request to the LLM and calls the LLM before responding to user.
+    In streaming mode, partial output is emitted as `llm_response_chunk` events while the user is connected;
+    the final `llm_response` (or queued message) always carries the complete text.
     """
     prompt = req.prompt
 
+    # Use asynchronous LLMClient
+    struct_logger = logger.bind(user_id=uid)
+    struct_logger.info("llm_processing_start")
+    
+    if not llm_client:
+         struct_logger.error("llm_client_not_initialized")
+         return
+
     # Collect attachments if user uploaded any.
+    # Each one is moved to permanent storage and, if the knowledge base supports its type,
+    # queued for background ingestion; the chat turn only sends it to the model inline.
     attachments = []
+    ingestion_jobs = []
     user_dir = os.path.join(UPLOAD_DIR, uid)
     if os.path.exists(user_dir):
         for filename in os.listdir(user_dir):
-            file_path = os.path.join(user_dir, filename)
+            file_path = await run_in_threadpool(persist_upload, uid, os.path.join(user_dir, filename))
+            mime_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
             attachments.append({
                 "path": file_path,
-                "name": filename
+                "name": filename,
+                "mimeType": mime_type
             })
+            if not is_ingestible(file_path):
+                struct_logger.info("ingest_skipped_unsupported_type", filename=filename)
+                continue
+            try:
+                job_id = await enqueue_ingestion(uid, file_path, mime_type)
+                ingestion_jobs.append({'jobId': job_id, 'fileName': filename})
+            except Exception as e:
+                struct_logger.error("ingest_enqueue_failed", error=str(e), filename=filename)
 
-    # Use asynchronous LLMClient
-    struct_logger = logger.bind(user_id=uid)
-    struct_logger.info("llm_processing_start")
-    
-    if not llm_client:
-         struct_logger.error("llm_client_not_initialized")
-         return
+    # Only stream if someone is there to receive the chunks
+    on_chunk = stream_to_user(uid) if stream and await is_user_connected(uid) else None
 
-    message = await llm_client.sendMessage(
-        uid,
-        prompt,
-        attachments
-    )
+    # A failed turn still gets an answer, so the user is never left waiting (or with partial chunks)
+    try:
+        message = await llm_client.sendMessage(
+            uid,
+            prompt,
+            attachments,
+            on_chunk=on_chunk
+        )
+        response = {
+            'message': message,
+            'type': MessageType.Assistant
+        }
+    except TimeoutError:
+        struct_logger.error("llm_request_timed_out")
+        response = {
+            'message': "Sorry, that took too long to answer. Please try again.",
+            'type': MessageType.System
+        }
+    except APIError as e:
+        struct_logger.error("llm_api_error", error=str(e), code=getattr(e, 'code', None))
+        response = {
+            'message': "Sorry, the assistant is unavailable right now. Please try again shortly.",
+            'type': MessageType.System
+        }
+    except Exception as e:
+        struct_logger.exception("llm_request_failed", error=str(e))
+        response = {
+            'message': "Sorry, something went wrong while answering. Please try again.",
+            'type': MessageType.System
+        }
 
-    response = {
-        'message': message,
-        'type': MessageType.Assistant
-    }
+    # Lets the client follow its files' ingestion (GET /ingestion/{job_id}) even if it missed the events
+    if ingestion_jobs:
+        response['ingestionJobs'] = ingestion_jobs
 
     # --- CLEANUP USER TEMP UPLOAD FILES ---
     if os.path.exists(user_dir):
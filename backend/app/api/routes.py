@@ -1,13 +1,18 @@
 import os
 import shutil
-from fastapi import APIRouter, Response, HTTPException, UploadFile, File, Form, BackgroundTasks, Depends, Body, Header
+from fastapi import APIRouter, Request, Response, HTTPException, UploadFile, File, Form, BackgroundTasks, Depends, Body, Header
 from app.schemas.models import AuthPayload, AuthResponse, SendMessageRequest, IntegrationExchangeRequest, JWTPayload, GoogleAuthRequest
-from app.api.deps import get_db, get_llm_client, verify_jwt
+from app.api.deps import get_db, get_llm_client, verify_jwt, require_admin
 from app.core.logger import logger
-from app.core.security import create_access_token, create_refresh_token, verify_token
-from app.core.config import UPLOAD_DIR
+from app.core.security import create_access_token, create_refresh_token, verify_token, verified_token_cache_stats
+from app.core.config import UPLOAD_DIR, AUTH_MAX_CONCURRENT_PER_IP, AUTH_MAX_CONCURRENT_PER_EMAIL, AUTH_TRUST_FORWARDED_FOR
+from app.core.rate_limit import concurrency_slots, ConcurrencyLimitExceeded
 from app.core.sso import verify_google_token
+from app.core.executor import integration_executor, password_executor
+from app.services.tools import invalidate_calendar_service, calendar_service_cache_stats
+from app.services.tools.listing_cache import listing_cache
 from app.api.logic import process_llm_request
+from app.services.ingestion import get_ingestion_status
 from fastapi.concurrency import run_in_threadpool
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
@@ -22,8 +27,30 @@ PROVIDERS = {
     "todoist": TodoistProvider(),
 }
 
+def client_ip(request: Request) -> str:
+    """
+    The address of the client that made the request.
+    With AUTH_TRUST_FORWARDED_FOR, the last X-Forwarded-For entry (the one our proxy appended) is used;
+    earlier entries are client-supplied and could be spoofed.
+    """
+    if AUTH_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for", "")
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if hops:
+            return hops[-1]
+    return request.client.host if request.client else "unknown"
+
+def password_check_limits(request: Request, email: str) -> dict:
+    """
+    Redis keys and limits bounding concurrent bcrypt work per client IP and per email.
+    """
+    return {
+        f"auth_inflight:ip:{client_ip(request)}": AUTH_MAX_CONCURRENT_PER_IP,
+        f"auth_inflight:email:{email.lower()}": AUTH_MAX_CONCURRENT_PER_EMAIL,
+    }
+
 @router.post('/registerUser')
-async def registerUser(data: AuthPayload, response: Response, db=Depends(get_db)) -> AuthResponse:
+async def registerUser(data: AuthPayload, request: Request, response: Response, db=Depends(get_db)) -> AuthResponse:
     """
     Handles new user registration.
     """
@@ -31,11 +58,17 @@ async def registerUser(data: AuthPayload, response: Response, db=Depends(get_db)
     struct_logger = logger.bind(email=data.email)
     struct_logger.info("http_register_user_attempt")
     
-    status, db_response = await db.create_user(email=data.email, password=data.password)
+    try:
+        async with concurrency_slots(password_check_limits(request, data.email)):
+            status, db_response = await db.create_user(email=data.email, password=data.password)
+    except ConcurrencyLimitExceeded:
+        struct_logger.warn("http_register_user_throttled")
+        response.status_code = 429
+        return AuthResponse(status=False, detail="Too many attempts, please try again shortly")
 
     if not status:
         response.status_code = 401
-        struct_logger.error("http_register_user_failed", reason=db_response, provided_hash=data.password)
+        struct_logger.error("http_register_user_failed", reason=db_response)
         return AuthResponse(status=False, detail=db_response)
     else:
         # Generate JWTs
@@ -51,7 +84,7 @@ async def registerUser(data: AuthPayload, response: Response, db=Depends(get_db)
 
 
 @router.post('/login')
-async def login(data: AuthPayload, response: Response, db=Depends(get_db)) -> AuthResponse:
+async def login(data: AuthPayload, request: Request, response: Response, db=Depends(get_db)) -> AuthResponse:
     """
     Handles user logins.
     """
@@ -59,10 +92,16 @@ async def login(data: AuthPayload, response: Response, db=Depends(get_db)) -> Au
     struct_logger = logger.bind(email=data.email)
     struct_logger.info("http_login_attempt")
 
-    status, db_response = await db.login(email=data.email, password=data.password)
+    try:
+        async with concurrency_slots(password_check_limits(request, data.email)):
+            status, db_response = await db.login(email=data.email, password=data.password)
+    except ConcurrencyLimitExceeded:
+        struct_logger.warn("http_login_throttled")
+        response.status_code = 429
+        return AuthResponse(status=False, detail="Too many attempts, please try again shortly")
 
     if not status:
-        struct_logger.warn("http_login_failed", reason=db_response, provided_hash=data.password)
+        struct_logger.warn("http_login_failed", reason=db_response)
         response.status_code = 401
         return AuthResponse(status=False, detail=db_response)
     else:
@@ -85,8 +124,8 @@ async def login_with_google(req: GoogleAuthRequest, response: Response, db=Depen
     """
     struct_logger = logger.bind(endpoint="auth_google")
     
-    # Verify Google Token asynchronously to avoid blocking the event loop with synchronous network/cert calls
-    id_info = await run_in_threadpool(verify_google_token, req.idToken)
+    # Verified locally against Google's cached certificates
+    id_info = await verify_google_token(req.idToken)
     email = id_info.get("email")
     
     if not email:
@@ -227,12 +266,28 @@ async def load_new_chat(db=Depends(get_db), llm_client=Depends(get_llm_client),
     uid = user.sub
 
     if llm_client:
-        await run_in_threadpool(llm_client.clear_history, uid)
+        await llm_client.clear_history(uid)
     else:
         raise HTTPException(status_code=500, detail="LLM Client not initialized")
         
     return {'status': 'success'}
 
+@router.get('/ingestion/{job_id}')
+async def ingestion_status(job_id: str, user: JWTPayload = Depends(verify_jwt)):
+    """
+    Reports the progress of a background attachment ingestion job.
+    """
+    job = await get_ingestion_status(job_id)
+    if not job or job.get('uid') != user.sub:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        'status': job['status'],
+        'fileName': os.path.basename(job['file_path']),
+        'attempts': int(job.get('attempts', 0)),
+        'error': job.get('error', ''),
+    }
+
 # ----- INTEGRATIONS -----
 
 @router.post('/integrations/providers/{provider}/exchange')
@@ -249,7 +304,7 @@ async def integration_exchange(provider:str, req: IntegrationExchangeRequest, db
     tokens = await PROVIDERS[provider].exchange_code(req.code)
 
     # Verify Identity
-    user_info = PROVIDERS[provider].verify_identity(tokens)
+    user_info = await PROVIDERS[provider].verify_identity(tokens)
 
     await db.update_user_integration(
         uid=uid,
@@ -257,6 +312,8 @@ async def integration_exchange(provider:str, req: IntegrationExchangeRequest, db
         provider_user_id=user_info["sub"],
         tokens=tokens
     )
+    if provider == "google":
+        invalidate_calendar_service(uid)
 
     return { 'status': True }
 
@@ -277,6 +334,8 @@ async def revoke_integration(provider:str, db=Depends(get_db), user: JWTPayload
     if refresh_token and PROVIDERS.get(provider):
         if await PROVIDERS[provider].revoke(refresh_token):
             await db.delete_user_integration(uid, provider)
+            if provider == "google":
+                invalidate_calendar_service(uid)
             return { 'status': True }
         else:
             raise HTTPException(status_code=500, detail="Error revoking integration. Please revoke manually from the provider.")
@@ -300,3 +359,22 @@ async def validate_integration(provider: str, db=Depends(get_db), user: JWTPaylo
     else:
         return { 'status': False }
 
+# ----- METRICS -----
+
+@router.get('/metrics')
+async def metrics(db=Depends(get_db), llm_client=Depends(get_llm_client), user: JWTPayload = Depends(require_admin)):
+    """
+    Reports this worker's internal pool and cache statistics. Admins only (ADMIN_UIDS).
+    """
+    return {
+        'chat_sessions': llm_client.sessions.stats(),
+        'embeddings': llm_client.vdbmanager.embeddings.stats(),
+        'rag_files': llm_client.file_parts.stats(),
+        'integration_executor': integration_executor.stats(),
+        'password_executor': password_executor.stats(),
+        'gcal_service_cache': calendar_service_cache_stats(),
+        'listing_cache': listing_cache.stats(),
+        'user_cache': db.user_cache.stats(),
+        'verified_tokens': verified_token_cache_stats(),
+        'vector_indexes': await llm_client.vdbmanager.vector_index_status(),
+    }
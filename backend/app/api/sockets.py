@@ -55,11 +55,14 @@ async def connect(sid, environ, auth):
         # Tell the client connection was successful
         await sio.emit("connectSuccess", { "token": uid }, room=sid)
 
-        message_queue = await dbmanager.dequeueMessageQueue(uid)
+        # Deliver queued messages in order, then acknowledge them so they are removed.
+        # A flush interrupted before the ack is redelivered on the next connect.
+        message_queue = await dbmanager.fetchMessageQueue(uid)
         if message_queue:
             struct_logger.info("ws_flushing_queue", count=len(message_queue))
-            for payload in message_queue:
-                await sio.emit('llm_response', {'status': 'success', 'response': payload}, room=uid)
+            for entry in message_queue:
+                await sio.emit('llm_response', {'status': 'success', 'response': entry['message'], 'seq': entry['seq']}, room=uid)
+            await dbmanager.ackMessageQueue(uid, [entry['seq'] for entry in message_queue])
         struct_logger.info("ws_flushed_message_queue");
         await sio.emit("messageQueueFlushed", room=uid)
     else:
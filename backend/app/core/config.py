@@ -6,12 +6,55 @@ load_dotenv()
 CHAT_SIZE_LIMIT = 300
 LLM_MODEL = os.getenv("LLM_MODEL")
 
+# Per-user chat sessions (counts and seconds)
+CHAT_SESSION_POOL_SIZE = int(os.getenv("CHAT_SESSION_POOL_SIZE", "64"))
+CHAT_SESSION_IDLE_TTL = int(os.getenv("CHAT_SESSION_IDLE_TTL", "1800"))
+CHAT_HISTORY_TTL = int(os.getenv("CHAT_HISTORY_TTL", "604800"))
+# Only the most recent turns of history are kept; long-lived context comes from stored preferences
+CHAT_HISTORY_MAX_TURNS = int(os.getenv("CHAT_HISTORY_MAX_TURNS", "20"))
+
+# Upper bound (seconds) for a single Gemini round trip
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_STREAM_RESPONSES = os.getenv("LLM_STREAM_RESPONSES", "true").lower() == "true"
+
+# Tool calls requested in a single model turn run concurrently
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "20"))
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+
+# Thread pool for blocking Google Calendar / Todoist SDK calls
+INTEGRATION_IO_WORKERS = int(os.getenv("INTEGRATION_IO_WORKERS", "8"))
+INTEGRATION_IO_MAX_PENDING = int(os.getenv("INTEGRATION_IO_MAX_PENDING", "32"))
+# bcrypt runs on its own small pool per worker; BCRYPT_ROUNDS changes are applied by rehashing on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "1"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "8"))
+# Concurrent password checks allowed per client IP and per email, across all workers
+AUTH_MAX_CONCURRENT_PER_IP = int(os.getenv("AUTH_MAX_CONCURRENT_PER_IP", "4"))
+AUTH_MAX_CONCURRENT_PER_EMAIL = int(os.getenv("AUTH_MAX_CONCURRENT_PER_EMAIL", "1"))
+# Only enable behind a reverse proxy that appends X-Forwarded-For; the client IP is then its last entry
+AUTH_TRUST_FORWARDED_FOR = os.getenv("AUTH_TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Per-user Google Calendar service objects (count and seconds)
+GCAL_SERVICE_CACHE_SIZE = int(os.getenv("GCAL_SERVICE_CACHE_SIZE", "128"))
+GCAL_SERVICE_CACHE_TTL = int(os.getenv("GCAL_SERVICE_CACHE_TTL", "3600"))
+
+# Read-through cache for calendar and task listings (seconds and entries per worker)
+TOOL_CACHE_TTL = int(os.getenv("TOOL_CACHE_TTL", "60"))
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "512"))
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 TODOIST_API_KEY = os.getenv("TODOIST_API_KEY")
 
 DATABASE_URL = os.getenv("DATABASE_URL", "mongodb://localhost:27017")
 REDIS_URL = os.getenv("REDIS_URL")
 DB_NAME = os.getenv("PAGENT_DB_NAME")
+# Offline message queue: seconds a message is kept, and messages kept per user
+MESSAGE_QUEUE_TTL = int(os.getenv("MESSAGE_QUEUE_TTL", "604800"))
+MESSAGE_QUEUE_MAX = int(os.getenv("MESSAGE_QUEUE_MAX", "200"))
+# User record cache: records per worker, in-process and Redis lifetimes (seconds)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "512"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_REDIS_TTL = int(os.getenv("USER_CACHE_REDIS_TTL", "300"))
 
 DESKTOP_FCM_TOKEN = os.getenv("DESKTOP_FCM_TOKEN")
 IPHONE_FCM_TOKEN = os.getenv("IPHONE_FCM_TOKEN")
@@ -20,8 +63,51 @@ FCM_SECRETS_DIR = os.getenv("FCM_SECRETS_DIR", "/app/secrets")
 APP_IDENTIFIER = os.getenv("APP_IDENTIFIER")
 STORAGE_PATH = os.getenv("STORAGE_PATH")
 VDB_DEST = os.getenv("VDB_DEST")
+# Seconds after which an open table handle re-checks for writes made by other workers
+VDB_READ_CONSISTENCY_SECONDS = float(os.getenv("VDB_READ_CONSISTENCY_SECONDS", "5"))
+# ANN indexes are built once a table reaches VDB_INDEX_MIN_ROWS rows and maintained every VDB_INDEX_INTERVAL seconds
+VDB_INDEX_MIN_ROWS = int(os.getenv("VDB_INDEX_MIN_ROWS", "5000"))
+VDB_INDEX_INTERVAL = int(os.getenv("VDB_INDEX_INTERVAL", "900"))
+# Search recall settings: IVF partitions probed, and PQ candidates re-ranked with full vectors
+VDB_NPROBES = int(os.getenv("VDB_NPROBES", "20"))
+VDB_REFINE_FACTOR = int(os.getenv("VDB_REFINE_FACTOR", "5"))
+
+# Embedding requests are coalesced into batched calls
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "gemini-embedding-001")
+EMBEDDING_BATCH_WINDOW_MS = int(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "10"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "100"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "2"))
+EMBEDDING_MAX_QUEUE = int(os.getenv("EMBEDDING_MAX_QUEUE", "1000"))
+# Content-hash keyed embedding cache (vectors per worker, seconds)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "2592000"))
+
+# Document ingestion: chunk size and overlap (estimated tokens), chunks embedded per batch
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "400"))
+INGEST_CHUNK_OVERLAP = int(os.getenv("INGEST_CHUNK_OVERLAP", "60"))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "32"))
+# Background ingestion queue: consumers per worker, attempts per job, lease and retry backoff (seconds)
+INGEST_CONSUMERS = int(os.getenv("INGEST_CONSUMERS", "1"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "120"))
+INGEST_RETRY_BACKOFF = int(os.getenv("INGEST_RETRY_BACKOFF", "30"))
 UPLOAD_DIR = os.getenv("UPLOAD_DIR")
 
+# RAG retrieval: minimum cosine similarity, prompt words needed to search, files and bytes attached per turn
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.6"))
+RAG_MIN_PROMPT_WORDS = int(os.getenv("RAG_MIN_PROMPT_WORDS", "3"))
+RAG_MAX_FILES = int(os.getenv("RAG_MAX_FILES", "3"))
+RAG_BYTE_BUDGET = int(os.getenv("RAG_BYTE_BUDGET", "4194304"))
+# Files up to RAG_INLINE_MAX_BYTES are sent inline from a payload cache (entries, seconds); larger ones by upload URI
+RAG_INLINE_MAX_BYTES = int(os.getenv("RAG_INLINE_MAX_BYTES", "262144"))
+RAG_FILE_CACHE_SIZE = int(os.getenv("RAG_FILE_CACHE_SIZE", "32"))
+RAG_FILE_CACHE_TTL = int(os.getenv("RAG_FILE_CACHE_TTL", "3600"))
+
+# User preferences: how many are injected per turn, minimum relevance, and similarity at which a new one replaces an old one
+PREF_TOP_K = int(os.getenv("PREF_TOP_K", "5"))
+PREF_MIN_SCORE = float(os.getenv("PREF_MIN_SCORE", "0.5"))
+PREF_DEDUPE_SCORE = float(os.getenv("PREF_DEDUPE_SCORE", "0.9"))
+
 GCAL_SECRETS_FILENAME = os.getenv("GCAL_SECRETS_FILENAME")
 GCAL_TOKEN_FILEPATH = os.getenv("GCAL_TOKEN_FILEPATH")
 
@@ -33,10 +119,16 @@ SERVICE_ACCOUNT_KEY = os.getenv("SERVICE_ACCOUNT_KEY")
 
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+# Refresh Google access tokens this many seconds before they expire
+GOOGLE_TOKEN_REFRESH_SKEW = int(os.getenv("GOOGLE_TOKEN_REFRESH_SKEW", "300"))
 
 # JWT Configuration
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "dev-secret-key-change-in-production")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
-REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
\ No newline at end of file
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Recently verified tokens kept per worker to skip repeated signature checks
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "1024"))
+# Comma-separated user ids allowed to read operational endpoints such as /metrics
+ADMIN_UIDS = frozenset(uid.strip() for uid in os.getenv("ADMIN_UIDS", "").split(",") if uid.strip())
\ No newline at end of file
@@ -0,0 +1,98 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from app.core.config import INTEGRATION_IO_WORKERS, INTEGRATION_IO_MAX_PENDING, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+class BoundedExecutor:
+    """
+    Dedicated thread pool for blocking calls made from the event loop.
+
+    At most `max_workers + max_pending` calls are submitted at once; further callers wait
+    (backpressure) instead of growing the pool queue without bound. Counters are updated
+    from the event loop only, so stats() is cheap and consistent.
+    """
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_workers + max_pending)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.saturated = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Runs `func(*args, **kwargs)` on the pool and awaits its result.
+        """
+        if self._slots.locked():
+            self.saturated += 1
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._pool.submit(functools.partial(func, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # The slot belongs to the thread, not the caller: a cancelled caller (e.g. a tool timeout)
+        # must not free it while the call is still running or queued in the pool
+        future.add_done_callback(lambda done: self._release_threadsafe(loop, done))
+        return await asyncio.wrap_future(future)
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop, future):
+        try:
+            loop.call_soon_threadsafe(self._release, future)
+        except RuntimeError:
+            # The loop is already closed (shutdown); nothing is left to account for
+            pass
+
+    def _release(self, future):
+        self.in_flight -= 1
+        self._slots.release()
+        if future is None or future.cancelled():
+            return
+        if future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'in_flight': self.in_flight,
+            'queue_depth': max(0, self.in_flight - self.max_workers),
+            'waiting': self.waiting,
+            'saturated': self.saturated,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Google Calendar and Todoist SDK calls
+integration_executor = BoundedExecutor(
+    "integration_io",
+    max_workers=INTEGRATION_IO_WORKERS,
+    max_pending=INTEGRATION_IO_MAX_PENDING
+)
+
+# bcrypt hashing and verification (CPU bound; bcrypt releases the GIL)
+password_executor = BoundedExecutor(
+    "password_hash",
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,38 @@
+from contextlib import asynccontextmanager
+from typing import Dict
+from app.core.redis import redis_client
+from app.core.logger import logger
+
+class ConcurrencyLimitExceeded(Exception):
+    pass
+
+@asynccontextmanager
+async def concurrency_slots(limits: Dict[str, int], ttl: int=30):
+    """
+    Holds one slot under each Redis counter key for the duration of the block, across all workers.
+    Raises ConcurrencyLimitExceeded if any key already has its limit of holders.
+
+    Counters expire after `ttl` seconds so slots held by a crashed worker are eventually freed.
+    If Redis is unavailable the block runs unlimited rather than failing the request.
+    """
+    held = []
+    try:
+        for key, limit in limits.items():
+            try:
+                pipe = redis_client.pipeline(transaction=True)
+                pipe.incr(key)
+                pipe.expire(key, ttl)
+                count, _ = await pipe.execute()
+            except Exception as e:
+                logger.warn("concurrency_limit_unavailable", key=key, error=str(e))
+                continue
+            held.append(key)
+            if count > limit:
+                raise ConcurrencyLimitExceeded(key)
+        yield
+    finally:
+        for key in held:
+            try:
+                await redis_client.decr(key)
+            except Exception as e:
+                logger.warn("concurrency_slot_release_failed", key=key, error=str(e))
@@ -3,3 +3,6 @@ from redis import asyncio as aioredis
 from app.core.config import REDIS_URL
 
 redis_client = aioredis.from_url(REDIS_URL, decode_responses=True)
+
+# For binary payloads (e.g. packed float32 vectors)
+redis_binary_client = aioredis.from_url(REDIS_URL)
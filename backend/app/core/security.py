@@ -1,12 +1,16 @@
+import time
+import hashlib
 import bcrypt
 import jwt
 from datetime import datetime, timedelta, timezone
-from app.core.config import JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+from app.core.config import JWT_SECRET_KEY, JWT_ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, BCRYPT_ROUNDS, JWT_CACHE_SIZE
+from app.core.cache import TTLCache
+from app.core.executor import password_executor
 from app.schemas.models import JWTPayload
 
 def hash_password(password: str) -> bytes:
     password_bytes: bytes = password.encode('utf-8')
-    hashed = bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds=12))
+    hashed = bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds=BCRYPT_ROUNDS))
 
     return hashed
 
@@ -15,6 +19,23 @@ def verify_password(submitted_password: str, stored_password: bytes) -> bool:
     submitted_password_bytes: bytes = submitted_password.encode('utf-8')
     return bcrypt.checkpw(submitted_password_bytes, stored_password)
 
+def password_needs_rehash(stored_password: bytes) -> bool:
+    """
+    Whether a stored bcrypt hash ($2b$<cost>$...) was made with a cost other than BCRYPT_ROUNDS.
+    """
+    try:
+        return int(stored_password.split(b'$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+# bcrypt takes hundreds of milliseconds per call on the Pi, so async callers run it on password_executor
+
+async def hash_password_async(password: str) -> bytes:
+    return await password_executor.run(hash_password, password)
+
+async def verify_password_async(submitted_password: str, stored_password: bytes) -> bool:
+    return await password_executor.run(verify_password, submitted_password, stored_password)
+
 def create_access_token(uid: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {
@@ -33,12 +54,34 @@ def create_refresh_token(uid: str) -> str:
     }
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
+# sha256(token) -> (sub, exp, type) of access tokens whose signature was already verified.
+# Each entry expires with its token, so an expired token is never served from here.
+_verified_tokens = TTLCache(maxsize=JWT_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def verified_token_cache_stats() -> dict:
+    return _verified_tokens.stats()
+
 def verify_token(token: str, expected_type: str = "access") -> JWTPayload:
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    cached = _verified_tokens.get(key)
+    if cached is not None:
+        sub, exp, token_type = cached
+        if exp > time.time():
+            if token_type != expected_type:
+                raise ValueError(f"Invalid token type. Expected {expected_type}")
+            # Fields were validated when the token was first verified
+            return JWTPayload.model_construct(sub=sub, exp=exp, type=token_type)
+
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
         
         # Pydantic validation guarantees 'sub', 'exp', and 'type' exist
         jwt_data = JWTPayload(**payload)
+
+        # Only short-lived access tokens are cached; refresh tokens are rare and long-lived
+        remaining = jwt_data.exp - time.time()
+        if jwt_data.type == "access" and remaining > 0:
+            _verified_tokens.set(key, (jwt_data.sub, jwt_data.exp, jwt_data.type), ttl=remaining)
         
         if jwt_data.type != expected_type:
             raise ValueError(f"Invalid token type. Expected {expected_type}")
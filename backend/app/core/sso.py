@@ -1,21 +1,19 @@
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from fastapi import HTTPException
 from app.core.logger import logger
-from app.api.integrations.google import get_google_secrets
+from app.api.integrations.transport import get_google_client_config
+from app.api.integrations.google import verify_google_id_token
 
-def verify_google_token(token: str) -> dict:
+async def verify_google_token(token: str) -> dict:
     struct_logger = logger.bind(func_call="verify_google_token")
     try:
-        secrets = get_google_secrets()
-        client_config = secrets.get("web") or secrets.get("installed", {})
+        client_config = get_google_client_config()
         client_id = client_config.get("client_id")
 
         if not client_id:
             struct_logger.error("google_client_id_missing")
             raise Exception("Google Client ID is missing from configuration.")
 
-        id_info = id_token.verify_oauth2_token(token, requests.Request(), client_id)
+        id_info = await verify_google_id_token(token, client_id)
         
         struct_logger.info("google_sso_token_verified", email=id_info.get("email"))
         return id_info
@@ -1,21 +1,28 @@
+import time
 from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import uuid
 from uuid import UUID
-from typing import Dict, List
+from typing import Callable, Dict, List
 from bson.binary import UuidRepresentation
 import app.core.security
 from functools import wraps
 from app.core.logger import logger
+from app.core.cache import TTLCache
+from app.db.user_cache import UserRecordCache
 
 # Import environment variables
-from app.core.config import DATABASE_URL, DB_NAME
+from app.core.config import DATABASE_URL, DB_NAME, MESSAGE_QUEUE_TTL, MESSAGE_QUEUE_MAX, USER_CACHE_SIZE, USER_CACHE_TTL
 
 @dataclass
 class Integration:
     integration_user_id: str
     refresh_token: str
     access_token: str
+    expires_at: int = 0
 
 @dataclass
 class User:
@@ -24,23 +31,35 @@ class User:
     passwordHash: bytes
     notificationToken: str
     refreshToken: str = ""
-    messageQueue: List[Dict] = field(default_factory=list)
     integrations: Dict[str, Integration] = field(default_factory=dict)
 
 
-def get_user(func):
-    @wraps(func)
-    async def wrapper(self, uid: UUID, *args, **kwargs):
-        struct_logger = logger.bind(func_call=func.__name__, user_id=str(uid))
-        response = await self.users.find_one({
-            'uid': uid
-        })
-        if not response:
-            struct_logger.error("db_user_not_found")
-            return False, "User not found"
-        
-        return await func(self, response, *args, **kwargs)
-    return wrapper
+def get_user(projection: Dict | Callable[..., Dict] = None):
+    """
+    Loads the user document by uid and passes it to the decorated method in place of the uid.
+
+    `projection` limits the fields fetched (uid is always included). It may be a dict, or a callable
+    that receives the method's other arguments and returns one (e.g. to fetch a single integration).
+    Without a projection the whole document is fetched.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(self, uid: UUID, *args, **kwargs):
+            struct_logger = logger.bind(func_call=func.__name__, user_id=str(uid))
+            fields = projection(*args, **kwargs) if callable(projection) else projection
+            if fields is not None:
+                fields = {**fields, 'uid': 1, '_id': 0}
+
+            response = await self.users.find_one({
+                'uid': uid
+            }, projection=fields)
+            if not response:
+                struct_logger.error("db_user_not_found")
+                return False, "User not found"
+            
+            return await func(self, response, *args, **kwargs)
+        return wrapper
+    return decorator
 
 class DBManager():
     def __init__(self):
@@ -48,11 +67,57 @@ class DBManager():
             self.client = AsyncIOMotorClient(DATABASE_URL, uuidRepresentation="standard")
             self.db = self.client[DB_NAME]
             self.users = self.db["users"]
+            # Offline messages, one document per message ordered by a per-user sequence number
+            self.message_queue = self.db["message_queue"]
+            self.counters = self.db["counters"]
+            # Hot per-user fields (validity, notification token, integrations) read on every connect and tool call
+            self.user_cache = UserRecordCache()
+            # Integration tokens never leave the process; entries are checked against the record's metadata
+            self.integration_tokens = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
             logger.info("db_initialized", db_name=DB_NAME)
 
         except Exception as e:
             logger.critical("db_init_failed", error=str(e))
 
+    async def ensure_indexes(self):
+        """
+        Creates the indexes the queries below rely on. Safe to run on every startup.
+        """
+        for field_name in ('uid', 'email'):
+            try:
+                await self.users.create_index(field_name, unique=True)
+            except Exception as e:
+                # Existing duplicates block a unique index; keep serving and surface it in the logs
+                logger.critical("db_unique_index_failed", field=field_name, error=str(e))
+        await self.message_queue.create_index([('uid', ASCENDING), ('seq', ASCENDING)], unique=True)
+        # Mongo's TTL monitor deletes messages once expires_at has passed
+        await self.message_queue.create_index('expires_at', expireAfterSeconds=0)
+        logger.info("db_indexes_ensured")
+
+    async def _load_user_record(self, uid: str) -> Dict:
+        user = await self.users.find_one(
+            {'uid': uid},
+            projection={'_id': 0, 'notificationToken': 1, 'integrations': 1}
+        )
+        if not user:
+            return {'exists': False}
+        # The record is shared through Redis, so integrations carry metadata only, never tokens
+        return {
+            'exists': True,
+            'notificationToken': user.get('notificationToken', ""),
+            'integrations': {
+                provider: {
+                    'provider_user_id': integration.get('provider_user_id'),
+                    'expires_at': integration.get('expires_at', 0),
+                    'has_refresh_token': bool(integration.get('refresh_token')),
+                }
+                for provider, integration in user.get('integrations', {}).items()
+            },
+        }
+
+    async def _user_record(self, uid: UUID | str) -> Dict:
+        return await self.user_cache.get(str(uid), self._load_user_record)
+
     async def create_user(self, email: str, password: str) -> bool:
         struct_logger = logger.bind(email=email)
         struct_logger.info("db_create_user_attempt")
@@ -61,7 +126,7 @@ class DBManager():
         try:
             exists = await self.users.find_one({
                 "email": email
-            })
+            }, projection={'_id': 1})
             if exists:
                 struct_logger.warn("db_create_user_email_taken")
                 # If a user already exists, with that email, return False and error message
@@ -77,18 +142,22 @@ class DBManager():
         new_user: User = User(
             uid=uid,
             email=email,
-            passwordHash=app.core.security.hash_password(password),
+            passwordHash=await app.core.security.hash_password_async(password),
             notificationToken="",
             refreshToken="",
-            messageQueue=[],
             integrations={},
         )
 
         try:
             # If user is successfully inserted, return True and the user's UUID
             await self.users.insert_one(asdict(new_user))
+            await self.user_cache.invalidate(uid)
             struct_logger.info("db_create_user_success")
             return True, uid
+        except DuplicateKeyError:
+            # Registered concurrently; the unique email index rejected the second insert
+            struct_logger.warn("db_create_user_email_taken")
+            return False, "email taken. Please choose a different email"
         except Exception as e:
             struct_logger.error("db_create_user_insert_failed", error=str(e))
             return False, "Error registering user..."
@@ -101,7 +170,7 @@ class DBManager():
             'email': email,
         }
 
-        response = await self.users.find_one(query)
+        response = await self.users.find_one(query, projection={'_id': 0, 'uid': 1, 'passwordHash': 1})
         
         if not response:
             struct_logger.warn("db_login_failed_user_not_found")
@@ -112,8 +181,10 @@ class DBManager():
         struct_logger.warn("debug_db_login_response", found_user=True)
         
         try:
-            if app.core.security.verify_password(submitted_password=password, stored_password=stored_hash):
+            if await app.core.security.verify_password_async(submitted_password=password, stored_password=stored_hash):
                 struct_logger.info("db_login_success", user_id=response.get('uid'))
+                if app.core.security.password_needs_rehash(stored_hash):
+                    await self._rehash_password(response.get('uid'), password, stored_hash)
                 return True, response.get('uid')
             else:
                 struct_logger.warn("db_login_failed_password_mismatch")
@@ -122,6 +193,21 @@ class DBManager():
         
         return False, 'Invalid email or password'
 
+    async def _rehash_password(self, uid: str, password: str, stored_hash: bytes):
+        """
+        Re-hashes a password with the current bcrypt cost after a successful login.
+        The update only applies if the stored hash is unchanged, so a concurrent password change wins.
+        """
+        try:
+            new_hash = await app.core.security.hash_password_async(password)
+            await self.users.update_one(
+                filter={'uid': uid, 'passwordHash': stored_hash},
+                update={'$set': {'passwordHash': new_hash}}
+            )
+            logger.info("db_password_rehashed", user_id=uid)
+        except Exception as e:
+            logger.warn("db_password_rehash_failed", user_id=uid, error=str(e))
+
     async def find_or_create_sso_user(self, email: str) -> bool:
         """
         Returns (success, uid or error message).
@@ -131,7 +217,7 @@ class DBManager():
         
         # Check if user exists
         try:
-            response = await self.users.find_one({"email": email})
+            response = await self.users.find_one({"email": email}, projection={'_id': 0, 'uid': 1})
             if response:
                 struct_logger.info("db_sso_login_success", user_id=response.get("uid"))
                 return True, response.get("uid")
@@ -149,44 +235,54 @@ class DBManager():
             passwordHash=b'', # No password since SSO
             notificationToken="",
             refreshToken="",
-            messageQueue=[],
             integrations={},
         )
         
         try:
             await self.users.insert_one(asdict(new_user))
+            await self.user_cache.invalidate(uid)
             struct_logger.info("db_sso_create_user_success", user_id=uid)
             return True, uid
+        except DuplicateKeyError:
+            # A concurrent first sign-in created the user; use that one
+            response = await self.users.find_one({"email": email}, projection={'_id': 0, 'uid': 1})
+            if response:
+                return True, response.get("uid")
+            return False, "Error registering SSO user..."
         except Exception as e:
             struct_logger.error("db_sso_insert_failed", error=str(e))
             return False, "Error registering SSO user..."
 
-    @get_user
-    async def addNotificationToken(self, response: Dict, token) -> bool:
+    async def addNotificationToken(self, uid: UUID, token) -> bool:
         """
         Registers a user's notification token.
         Saves the token in the user's document in the database.
         """
-        
-        # Note: uid is bound in the decorators wrapper
-        logger.info("db_add_notification_token")
-        response["notificationToken"] = token
-        await self.users.update_one(filter={'uid': response.get('uid')}, update={ "$set": response })
+        result = await self.users.update_one(filter={'uid': uid}, update={'$set': {'notificationToken': token}})
+        if not result.matched_count:
+            logger.error("db_user_not_found", func_call="addNotificationToken", user_id=str(uid))
+            return False
+
+        await self.user_cache.invalidate(uid)
+        logger.info("db_add_notification_token", user_id=str(uid))
         return True
 
-    @get_user
-    async def getNotificationToken(self, response: Dict) -> str:
+    async def getNotificationToken(self, uid: UUID) -> str:
         """
         Returns the user's notification token.
 
         If the user doesn't have a notification token stored in the system, raises an error.
         """
-        
-        token = response.get("notificationToken")
+        record = await self._user_record(uid)
+        if not record['exists']:
+            logger.error("db_user_not_found", func_call="getNotificationToken", user_id=str(uid))
+            return False, "User not found"
+
+        token = record.get("notificationToken")
         if token:
             return True, token
         else:
-            logger.error("db_get_notification_token_missing", user_id=response.get('uid'))
+            logger.error("db_get_notification_token_missing", user_id=str(uid))
             
     async def update_refresh_token(self, uid: UUID | str, token: str) -> bool:
         """
@@ -204,52 +300,105 @@ class DBManager():
             struct_logger.error("db_update_refresh_token_failed", error=str(e))
             return False
 
-    @get_user
+    @get_user(projection={'refreshToken': 1})
     async def get_refresh_token(self, response: Dict) -> str:
         """
         Returns the user's refresh token.
         """
         return response.get("refreshToken")
     
+    # ----- MESSAGE QUEUE -----
+    async def _next_message_seq(self, uid: str) -> int:
+        counter = await self.counters.find_one_and_update(
+            {'_id': f"message_queue:{uid}"},
+            {'$inc': {'seq': 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter['seq']
+
     async def insertMessageQueue(self, uid: UUID, message: Dict) -> bool:
         """
         Inserts a message into the user's message queue.
         Used to cache messages to be sent to the user when they connect to the server.
-        
+
+        Messages expire after MESSAGE_QUEUE_TTL seconds, and only the newest MESSAGE_QUEUE_MAX are kept.
+
         Returns:
             bool: True if the message was successfully inserted, False otherwise.
         """
-
+        uid = str(uid)
         struct_logger = logger.bind(user_id=uid)
         struct_logger.debug("db_insert_message_queue_attempt", message=message)
-        
-        await self.users.update_one(filter={'uid': uid}, update={ '$push': { 'messageQueue': message } })
-        
-        struct_logger.info("db_message_queue_updated")
+
+        try:
+            seq = await self._next_message_seq(uid)
+            now = datetime.now(timezone.utc)
+            await self.message_queue.insert_one({
+                'uid': uid,
+                'seq': seq,
+                'message': message,
+                'created_at': now,
+                'expires_at': now + timedelta(seconds=MESSAGE_QUEUE_TTL),
+            })
+            if seq > MESSAGE_QUEUE_MAX:
+                await self.message_queue.delete_many({'uid': uid, 'seq': {'$lte': seq - MESSAGE_QUEUE_MAX}})
+        except Exception as e:
+            struct_logger.error("db_message_queue_insert_failed", error=str(e))
+            return False
+
+        struct_logger.info("db_message_queue_updated", seq=seq)
         return True
-    
-    @get_user
-    async def dequeueMessageQueue(self, response: Dict):
+
+    async def _drain_legacy_message_queue(self, uid: str):
         """
-        Flushes user message queue and before returning it.
-        
-        Used for when user connects to server, to retrieve any messages
-        that were sent while they were offline.
+        Moves messages still queued inside the user document (the old storage) into the queue collection.
+        The field is removed atomically, so each legacy message is moved exactly once.
         """
+        user = await self.users.find_one_and_update(
+            {'uid': uid, 'messageQueue': {'$exists': True}},
+            {'$unset': {'messageQueue': ""}},
+            projection={'messageQueue': 1}
+        )
+        for message in (user or {}).get('messageQueue') or []:
+            await self.insertMessageQueue(uid, message)
 
-        queue = response.get("messageQueue")
-        count = len(queue)
-        
-        # Note: uid is bound in the decorator
-        logger.info("db_dequeue_message_queue", message_count=count)
+    async def fetchMessageQueue(self, uid: UUID, limit: int=MESSAGE_QUEUE_MAX) -> List[Dict]:
+        """
+        Returns the user's pending messages ({'seq', 'message'}) in order, oldest first.
+        Messages stay queued until acknowledged with ackMessageQueue.
+        """
+        uid = str(uid)
+        await self._drain_legacy_message_queue(uid)
+
+        cursor = self.message_queue.find(
+            {'uid': uid},
+            projection={'_id': 0, 'seq': 1, 'message': 1}
+        ).sort('seq', ASCENDING).limit(limit)
+        queue = await cursor.to_list(length=limit)
 
-        response['messageQueue'] = []
-        await self.users.update_one(filter={'uid': response.get('uid')}, update={ '$set': response })
+        logger.info("db_fetch_message_queue", user_id=uid, message_count=len(queue))
         return queue
 
+    async def ackMessageQueue(self, uid: UUID, seqs: List[int]) -> int:
+        """
+        Removes the user's queued messages with the given sequence numbers, once they were delivered.
+        Only delivered seqs are acknowledged: a message can be inserted with a lower seq than one
+        already fetched (seqs are allocated before the insert), and must stay queued.
+        Returns the number of messages removed.
+        """
+        result = await self.message_queue.delete_many({'uid': str(uid), 'seq': {'$in': list(seqs)}})
+        logger.info("db_ack_message_queue", user_id=str(uid), acked=len(seqs), removed=result.deleted_count)
+        return result.deleted_count
+
     # ----- INTEGRATIONS -----
     async def update_user_integration(self, uid: UUID, provider: str, provider_user_id: str, tokens: Dict):
         struct_logger = logger.bind(provider=provider, provider_user_id=provider_user_id)
+
+        # Token responses carry a relative lifetime; store the absolute expiry
+        expires_at = tokens.get('expires_at')
+        if not expires_at and tokens.get('expires_in'):
+            expires_at = int(time.time()) + int(tokens['expires_in'])
         try:
             await self.users.update_one(
                 filter={'uid': uid},
@@ -258,32 +407,70 @@ class DBManager():
                         f'integrations.{provider}': {
                             'provider_user_id': provider_user_id,
                             'refresh_token': tokens.get('refresh_token'),
-                            'access_token': tokens.get('access_token')
+                            'access_token': tokens.get('access_token'),
+                            'expires_at': expires_at or 0
                         }
                     }
                 }
             )
+            self.integration_tokens.pop((str(uid), provider))
+            await self.user_cache.invalidate(uid)
             struct_logger.info("db_integration_tokens_updated")
             return True
         except Exception as e:
             struct_logger.error("db_integration_tokens_update_failed", error=str(e))
             return False
 
-    @get_user
-    async def get_user_integration(self, response: Dict, provider: str) -> Integration:
+    @get_user(projection=lambda provider: {f'integrations.{provider}': 1})
+    async def _get_user_integration_uncached(self, response: Dict, provider: str) -> Dict:
+        return response
+
+    async def get_user_integration(self, uid: UUID, provider: str, fresh: bool=False) -> Integration:
+        """
+        Returns the user's integration with a provider, or None if there is none.
+
+        Whether the integration exists is answered from the user record cache. Its tokens are read
+        from Mongo and kept only in this worker's memory, and reused while they match the record's
+        metadata (another worker's refresh changes expires_at). `fresh` always reads Mongo
+        (e.g. to see another worker's token refresh before the invalidation arrives).
+        """
+        key = (str(uid), provider)
+        if not fresh:
+            record = await self._user_record(uid)
+            if not record['exists']:
+                logger.error("db_user_not_found", func_call="get_user_integration", user_id=str(uid))
+                return False, "User not found"
+
+            metadata = record.get('integrations', {}).get(provider)
+            if not metadata:
+                logger.error("db_integration_not_found", provider=provider)
+                return None
+
+            cached = self.integration_tokens.get(key)
+            if (cached and cached.integration_user_id == metadata['provider_user_id']
+                    and cached.expires_at == metadata['expires_at']):
+                return cached
+
+        response = await self._get_user_integration_uncached(uid, provider)
+        if isinstance(response, tuple):
+            return response
+
         integration = response.get('integrations', {}).get(provider, {})
 
         if not integration:
             logger.error("db_integration_not_found", provider=provider)
             return None
-        
-        return Integration(
+
+        result = Integration(
             integration_user_id=integration.get('provider_user_id'),
             refresh_token=integration.get('refresh_token', ''),
-            access_token=integration.get('access_token', '')
+            access_token=integration.get('access_token', ''),
+            expires_at=integration.get('expires_at', 0)
         )
+        self.integration_tokens.set(key, result)
+        return result
     
-    @get_user
+    @get_user(projection={})
     async def delete_user_integration(self, response: Dict, provider: str) -> bool:
         uid = response.get('uid')
         struct_logger = logger.bind(provider=provider)
@@ -296,6 +483,8 @@ class DBManager():
                     }
                 }
             )
+            self.integration_tokens.pop((str(uid), provider))
+            await self.user_cache.invalidate(uid)
             struct_logger.info("db_integration_deleted")
             return True
         except Exception as e:
@@ -304,11 +493,9 @@ class DBManager():
     
     async def isValidUserID(self, uid: UUID) -> bool:
         struct_logger = logger.bind(user_id=str(uid))
-        user = await self.users.find_one({
-            'uid': uid
-        })
+        record = await self._user_record(uid)
 
-        if user:
+        if record['exists']:
             struct_logger.debug("db_user_id_valid")
             return True
         
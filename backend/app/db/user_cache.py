@@ -0,0 +1,120 @@
+import json
+import asyncio
+from typing import Awaitable, Callable, Dict
+from app.core.cache import TTLCache
+from app.core.redis import redis_client
+from app.core.logger import logger
+from app.core.config import USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_REDIS_TTL
+
+INVALIDATION_CHANNEL = "user_cache_invalidate"
+# Version counters outlive any cached record by a wide margin
+VERSION_TTL = 86400
+
+# Stores a loaded record only if the user's version has not moved since the load started,
+# i.e. no worker invalidated the record while it was being read from Mongo
+_SET_IF_CURRENT = redis_client.register_script("""
+if (redis.call('GET', KEYS[1]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+""")
+
+class UserRecordCache:
+    """
+    Two-tier cache of compact user records: whether the user exists, their notification token
+    and which integrations they have. Records are shared through Redis, so they must not hold
+    secrets such as integration tokens.
+
+    Records are kept briefly in-process and a little longer in Redis. Every write to those fields
+    calls invalidate(), which bumps the user's version in Redis, drops the Redis copy and publishes
+    the uid so every worker drops its local copy too (see listen()). A load that raced with an
+    invalidation is not cached: locally by the worker's own generation counter, and in Redis by
+    comparing the user's version before the load and at the write.
+    """
+    def __init__(self, maxsize: int=USER_CACHE_SIZE, ttl: int=USER_CACHE_TTL, redis_ttl: int=USER_CACHE_REDIS_TTL):
+        self.redis_ttl = redis_ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Bumped on every invalidation; a load only fills the cache if no invalidation happened meanwhile
+        self._generation = 0
+        self.redis_hits = 0
+
+    @staticmethod
+    def _key(uid: str) -> str:
+        # v2 records hold integration metadata only; older records also held tokens
+        return f"user_record:v2:{uid}"
+
+    @staticmethod
+    def _version_key(uid: str) -> str:
+        return f"user_record_version:{uid}"
+
+    async def get(self, uid: str, loader: Callable[[str], Awaitable[Dict]]) -> Dict:
+        uid = str(uid)
+        record = self._local.get(uid)
+        if record is not None:
+            return record
+
+        generation = self._generation
+        try:
+            stored, version = await redis_client.mget(self._key(uid), self._version_key(uid))
+        except Exception as e:
+            logger.warn("user_cache_read_failed", user_id=uid, error=str(e))
+            stored, version = None, None
+
+        if stored is not None:
+            self.redis_hits += 1
+            record = json.loads(stored)
+        else:
+            record = await loader(uid)
+            if generation == self._generation:
+                try:
+                    await _SET_IF_CURRENT(
+                        keys=[self._version_key(uid), self._key(uid)],
+                        args=[version or "0", json.dumps(record), self.redis_ttl],
+                    )
+                except Exception as e:
+                    logger.warn("user_cache_write_failed", user_id=uid, error=str(e))
+
+        if generation == self._generation:
+            self._local.set(uid, record)
+        return record
+
+    async def invalidate(self, uid: str):
+        uid = str(uid)
+        self._generation += 1
+        self._local.pop(uid)
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.incr(self._version_key(uid))
+            pipe.expire(self._version_key(uid), VERSION_TTL)
+            pipe.delete(self._key(uid))
+            await pipe.execute()
+            await redis_client.publish(INVALIDATION_CHANNEL, uid)
+        except Exception as e:
+            logger.warn("user_cache_invalidate_failed", user_id=uid, error=str(e))
+
+    async def listen(self):
+        """
+        Drops local records invalidated by other workers. Runs for the lifetime of the worker.
+        """
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached before (re)subscribing may have missed an invalidation
+                self._generation += 1
+                self._local.clear()
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self._generation += 1
+                        self._local.pop(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warn("user_cache_listener_failed", error=str(e))
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def stats(self) -> dict:
+        return {**self._local.stats(), 'redis_hits': self.redis_hits}
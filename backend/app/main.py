@@ -2,13 +2,18 @@
 from fastapi import FastAPI, Request
 from app.core.logger import configure_logger, logger
 from app.core.socket import sio
+from app.core.executor import integration_executor, password_executor
+from app.api.integrations.transport import init_http_client, close_http_client
 import socketio
+import asyncio
 import sys
 import uuid
 import structlog
 
 # Import initialized singletons to ensure they are set up
 from app.services.llm import get_llm_singleton
+from app.db.manager import dbmanager
+from app.services.ingestion import IngestionWorker
 from app.api.routes import router as api_router
 import app.api.sockets # Registers the socket events
 
@@ -44,9 +49,27 @@ combined = socketio.ASGIApp(sio, app)
 @app.on_event("startup")
 async def startup():
     # Initialize the LLM Client
-    get_llm_singleton()
+    llm_client = get_llm_singleton()
+    await init_http_client()
+    await dbmanager.ensure_indexes()
+    app.state.user_cache_listener = asyncio.create_task(dbmanager.user_cache.listen())
+
+    # Every worker consumes the shared ingestion queue
+    app.state.ingestion_worker = IngestionWorker(llm_client.vdbmanager)
+    app.state.ingestion_worker.start()
+    app.state.vdb_index_maintenance = asyncio.create_task(llm_client.vdbmanager.run_index_maintenance())
     logger.info("app_startup_complete")
 
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.ingestion_worker.stop()
+    app.state.vdb_index_maintenance.cancel()
+    app.state.user_cache_listener.cancel()
+    integration_executor.shutdown()
+    password_executor.shutdown()
+    await close_http_client()
+    logger.info("app_shutdown_complete")
+
 # ----- MIDDLEWARE -----
 
 @app.middleware("http")
@@ -0,0 +1,190 @@
+import weakref
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, List
+from pydantic import TypeAdapter
+from google.genai import types
+from app.core.cache import TTLCache
+from app.core.redis import redis_client
+from app.core.logger import logger
+from app.core.config import CHAT_SESSION_POOL_SIZE, CHAT_SESSION_IDLE_TTL, CHAT_HISTORY_TTL, CHAT_HISTORY_MAX_TURNS
+
+# Serializes history with the SDK's own model config (bytes fields as base64)
+_HISTORY_ADAPTER = TypeAdapter(List[types.Content])
+
+# Text parts starting with this tag carry per-turn context (e.g. retrieved preferences)
+# and are dropped from the persisted history, since the next turn retrieves them afresh
+TURN_CONTEXT_TAG = "[turn context]"
+
+@dataclass
+class ChatSession:
+    chat: Any
+    revision: str | None = None
+    turns: int = 0
+
+
+def _compact_history(history: List[types.Content]) -> List[types.Content]:
+    """
+    Strips files (inline bytes and uploaded file URIs) and turn context blocks from a chat history
+    before it is persisted. The model already answered with that content in context; keeping only
+    a placeholder keeps the stored history small, and avoids replaying file URIs after Gemini expires them.
+    """
+    compacted = []
+    for content in history:
+        parts = []
+        for part in content.parts or []:
+            if part.inline_data is not None:
+                parts.append(types.Part.from_text(text=f"[attachment: {part.inline_data.mime_type}]"))
+            elif part.file_data is not None:
+                parts.append(types.Part.from_text(text=f"[attachment: {part.file_data.mime_type}]"))
+            elif part.text and part.text.startswith(TURN_CONTEXT_TAG):
+                continue
+            else:
+                parts.append(part)
+        compacted.append(types.Content(role=content.role, parts=parts))
+    return compacted
+
+def _has_turn_payloads(history: List[types.Content]) -> bool:
+    """
+    Whether a history still holds anything _compact_history() would strip.
+    """
+    return any(
+        part.inline_data is not None or part.file_data is not None
+        or (part.text and part.text.startswith(TURN_CONTEXT_TAG))
+        for content in history for part in content.parts or []
+    )
+
+def _trim_history(history: List[types.Content], max_turns: int) -> List[types.Content]:
+    """
+    Keeps the last `max_turns` turns of a history.
+    A turn starts at a user message; tool results are also sent as user content but belong to
+    the turn in progress, so they never start the trimmed history.
+    """
+    starts = [
+        i for i, content in enumerate(history)
+        if content.role == "user" and not any(part.function_response for part in content.parts or [])
+    ]
+    if len(starts) <= max_turns:
+        return history
+    return history[starts[-max_turns]:]
+
+
+class ChatSessionPool:
+    """
+    Per-user pool of Gemini chat sessions.
+
+    Sessions live in a bounded LRU with an idle timeout so resident memory stays flat,
+    and their history is persisted to Redis after every turn so any worker can rehydrate
+    a user's chat. A revision counter stored alongside the history tells a worker when its
+    local copy is stale (the user's last turn was served by another worker).
+
+    Persisted histories are compacted (files and turn context replaced or dropped) and trimmed
+    to the last `max_history_turns` turns; the local chat continues from the same history.
+    """
+    def __init__(self, client, model: str, config: types.GenerateContentConfig, chat_size_limit: int,
+                 maxsize: int=CHAT_SESSION_POOL_SIZE, idle_ttl: int=CHAT_SESSION_IDLE_TTL, history_ttl: int=CHAT_HISTORY_TTL,
+                 max_history_turns: int=CHAT_HISTORY_MAX_TURNS):
+        self.client = client
+        self.model = model
+        self.config = config
+        self.chat_size_limit = chat_size_limit
+        self.history_ttl = history_ttl
+        self.max_history_turns = max_history_turns
+        self._sessions = TTLCache(maxsize=maxsize, ttl=idle_ttl, sliding=True)
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+    @staticmethod
+    def _key(uid: str) -> str:
+        return f"chat_session:{uid}"
+
+    def _create_chat(self, history: List[types.Content]=None):
+        return self.client.aio.chats.create(model=self.model, config=self.config, history=history or [])
+
+    @asynccontextmanager
+    async def session(self, uid: str):
+        """
+        Yields the user's chat session, serializing concurrent turns of the same user.
+        The session is written back to Redis when the turn completes successfully.
+        """
+        uid = str(uid)
+        lock = self._locks.get(uid)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[uid] = lock
+
+        async with lock:
+            session = await self._load(uid)
+            try:
+                yield session
+            except BaseException:
+                # The chat may hold a half-finished turn; rehydrate from Redis next time.
+                self._sessions.pop(uid)
+                raise
+            await self._persist(uid, session)
+
+    async def _load(self, uid: str) -> ChatSession:
+        self._sessions.purge_expired()
+        struct_logger = logger.bind(user_id=uid)
+
+        # Only the revision decides whether the local session is current; the history is
+        # fetched only when this worker has to rehydrate
+        try:
+            revision, turns = await redis_client.hmget(self._key(uid), "rev", "turns")
+        except Exception as e:
+            struct_logger.warn("chat_session_load_failed", error=str(e))
+            revision, turns = None, None
+
+        session = self._sessions.get(uid)
+        if session and session.revision == revision and session.turns < self.chat_size_limit:
+            return session
+
+        history = []
+        turns = int(turns or 0)
+        if revision is not None and turns < self.chat_size_limit:
+            try:
+                stored_history = await redis_client.hget(self._key(uid), "history")
+                if stored_history:
+                    history = _HISTORY_ADAPTER.validate_json(stored_history)
+                else:
+                    turns = 0
+            except Exception as e:
+                struct_logger.warn("chat_session_history_corrupt", error=str(e))
+                history, turns = [], 0
+        else:
+            turns = 0
+
+        session = ChatSession(chat=self._create_chat(history), revision=revision, turns=turns)
+        self._sessions.set(uid, session)
+        struct_logger.debug("chat_session_rehydrated", history_len=len(history))
+        return session
+
+    async def _persist(self, uid: str, session: ChatSession):
+        full_history = session.chat.get_history(curated=True)
+        history = _trim_history(_compact_history(full_history), self.max_history_turns)
+        if len(history) < len(full_history) or _has_turn_payloads(full_history):
+            # Continue locally from the compacted, trimmed history too, so attachment bytes are
+            # not held in memory and resent with every later prompt
+            session.chat = self._create_chat(history)
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hset(self._key(uid), mapping={
+                "history": _HISTORY_ADAPTER.dump_json(history, exclude_none=True).decode(),
+                "turns": session.turns,
+            })
+            pipe.hincrby(self._key(uid), "rev", 1)
+            pipe.expire(self._key(uid), self.history_ttl)
+            _, revision, _ = await pipe.execute()
+            session.revision = str(revision)
+        except Exception as e:
+            logger.warn("chat_session_persist_failed", user_id=uid, error=str(e))
+            session.revision = None
+        self._sessions.set(uid, session)
+
+    async def reset(self, uid: str):
+        uid = str(uid)
+        self._sessions.pop(uid)
+        await redis_client.delete(self._key(uid))
+
+    def stats(self) -> dict:
+        return self._sessions.stats()
@@ -0,0 +1,105 @@
+import re
+from dataclasses import dataclass
+from typing import List
+
+# A word plus its trailing whitespace
+_WORD = re.compile(r"\S+\s*")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token), good enough to size chunks
+    without loading a tokenizer.
+    """
+    return max(1, (len(text.strip()) + 3) // 4)
+
+
+@dataclass
+class Chunk:
+    text: str
+    index: int
+    page_start: int
+    page_end: int
+    char_start: int
+    char_end: int
+
+
+@dataclass
+class _Word:
+    text: str
+    tokens: int
+    page: int
+    offset: int
+
+
+class Chunker:
+    """
+    Incrementally splits a document into overlapping chunks of roughly `chunk_tokens` tokens.
+
+    Pages are fed one at a time with add_page(), so only the current chunk is held in memory.
+    Consecutive chunks share about `overlap_tokens` tokens, and chunks may span page boundaries;
+    each chunk records its page range and character offsets within the whole document.
+    """
+    def __init__(self, chunk_tokens: int=400, overlap_tokens: int=60):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self._buffer: List[_Word] = []
+        self._buffered_tokens = 0
+        self._new_words = 0
+        self._offset = 0
+        self._index = 0
+
+    def add_page(self, page: int, text: str) -> List[Chunk]:
+        """
+        Adds a page of text and returns the chunks it completed.
+        """
+        chunks = []
+        for match in _WORD.finditer(text):
+            word = _Word(text=match.group(), tokens=estimate_tokens(match.group()), page=page, offset=self._offset + match.start())
+            self._buffer.append(word)
+            self._buffered_tokens += word.tokens
+            self._new_words += 1
+            if self._buffered_tokens >= self.chunk_tokens:
+                chunks.append(self._emit())
+                self._keep_overlap()
+
+        # Pages are joined by a newline, both in chunk text and in document offsets
+        if self._buffer and self._buffer[-1].text == self._buffer[-1].text.rstrip():
+            self._buffer[-1].text += "\n"
+        self._offset += len(text) + 1
+        return chunks
+
+    def finish(self) -> List[Chunk]:
+        """
+        Returns the final partial chunk, if it holds anything not already emitted.
+        """
+        if not self._buffer or not self._new_words:
+            return []
+        chunk = self._emit()
+        self._buffer, self._buffered_tokens = [], 0
+        return [chunk]
+
+    def _emit(self) -> Chunk:
+        first, last = self._buffer[0], self._buffer[-1]
+        chunk = Chunk(
+            text="".join(word.text for word in self._buffer).strip(),
+            index=self._index,
+            page_start=first.page,
+            page_end=last.page,
+            char_start=first.offset,
+            char_end=last.offset + len(last.text.rstrip()),
+        )
+        self._index += 1
+        self._new_words = 0
+        return chunk
+
+    def _keep_overlap(self):
+        kept, tokens = [], 0
+        for word in reversed(self._buffer):
+            if tokens + word.tokens > self.overlap_tokens:
+                break
+            kept.append(word)
+            tokens += word.tokens
+        self._buffer = kept[::-1]
+        self._buffered_tokens = tokens
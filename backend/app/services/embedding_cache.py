@@ -0,0 +1,74 @@
+import hashlib
+import numpy as np
+from typing import Dict, List, Optional
+from app.core.cache import TTLCache
+from app.core.redis import redis_binary_client
+from app.core.logger import logger
+from app.core.config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embedding vectors.
+
+    Keys are a hash of the embedded content together with the model name and output
+    dimensionality, so changing either never returns a stale vector. Vectors are stored as
+    packed float32 bytes, in an in-process LRU in front of Redis.
+    """
+    def __init__(self, model: str, dimensionality: int, maxsize: int=EMBEDDING_CACHE_SIZE, ttl: int=EMBEDDING_CACHE_TTL):
+        self.model = model
+        self.dimensionality = dimensionality
+        self.ttl = ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis_hits = 0
+
+    def key_for(self, content: str | bytes) -> str:
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.sha256(content).hexdigest()
+        return f"emb:{self.model}:{self.dimensionality}:{digest}"
+
+    @staticmethod
+    def _pack(vector: List[float]) -> bytes:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _unpack(data: bytes) -> List[float]:
+        return np.frombuffer(data, dtype=np.float32).tolist()
+
+    async def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """
+        Returns the cached vector for each key, or None where there is none.
+        """
+        packed = [self._local.get(key) for key in keys]
+
+        missing = [i for i, value in enumerate(packed) if value is None]
+        if missing:
+            try:
+                stored = await redis_binary_client.mget([keys[i] for i in missing])
+            except Exception as e:
+                logger.warn("embedding_cache_read_failed", error=str(e))
+                stored = [None] * len(missing)
+            for i, value in zip(missing, stored):
+                if value is not None:
+                    self.redis_hits += 1
+                    packed[i] = value
+                    self._local.set(keys[i], value)
+
+        return [self._unpack(value) if value is not None else None for value in packed]
+
+    async def set_many(self, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+        packed = {key: self._pack(vector) for key, vector in vectors.items()}
+        for key, value in packed.items():
+            self._local.set(key, value)
+        try:
+            pipe = redis_binary_client.pipeline(transaction=False)
+            for key, value in packed.items():
+                pipe.set(key, value, ex=self.ttl)
+            await pipe.execute()
+        except Exception as e:
+            logger.warn("embedding_cache_write_failed", error=str(e))
+
+    def stats(self) -> dict:
+        return {**self._local.stats(), 'redis_hits': self.redis_hits}
@@ -0,0 +1,129 @@
+import asyncio
+from dataclasses import dataclass
+from typing import List
+from google.genai import types
+from app.core.logger import logger
+from app.services.embedding_cache import EmbeddingCache
+from app.core.config import (
+    EMBEDDING_MODEL, EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_MAX_BATCH,
+    EMBEDDING_MAX_CONCURRENCY, EMBEDDING_MAX_QUEUE
+)
+
+EMBEDDING_DIM = 768
+
+@dataclass
+class _EmbedRequest:
+    text: str
+    future: asyncio.Future
+
+
+class EmbeddingService:
+    """
+    Async text embedding with request coalescing.
+
+    Concurrent embed() calls are queued and collected for up to `batch_window_ms` into a single
+    batched embed_content call of at most `max_batch` texts. At most `max_concurrency` batches are
+    in flight; once `max_queue` texts are waiting, callers block until there is room (backpressure).
+    """
+    def __init__(self, client, model: str=EMBEDDING_MODEL, dimensionality: int=EMBEDDING_DIM,
+                 batch_window_ms: int=EMBEDDING_BATCH_WINDOW_MS, max_batch: int=EMBEDDING_MAX_BATCH,
+                 max_concurrency: int=EMBEDDING_MAX_CONCURRENCY, max_queue: int=EMBEDDING_MAX_QUEUE):
+        self.client = client
+        self.model = model
+        self.dimensionality = dimensionality
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._inflight = asyncio.Semaphore(max_concurrency)
+        self._queue: asyncio.Queue | None = None
+        self._batcher: asyncio.Task | None = None
+        self._batch_tasks: set[asyncio.Task] = set()
+        self.cache = EmbeddingCache(model=model, dimensionality=dimensionality)
+
+    def _ensure_started(self):
+        # The queue and batcher must be created on the running event loop
+        if self._batcher is None or self._batcher.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._batcher = asyncio.create_task(self._run())
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Returns one embedding per text, in order.
+        Texts embedded before are served from the embedding cache without an API call.
+        """
+        if not texts:
+            return []
+
+        keys = [self.cache.key_for(text) for text in texts]
+        vectors = await self.cache.get_many(keys)
+
+        # Embed each distinct uncached text once
+        pending: dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                pending.setdefault(key, text)
+
+        if pending:
+            self._ensure_started()
+            loop = asyncio.get_running_loop()
+            futures = []
+            for text in pending.values():
+                future = loop.create_future()
+                await self._queue.put(_EmbedRequest(text=text, future=future))
+                futures.append(future)
+
+            embedded = dict(zip(pending.keys(), await asyncio.gather(*futures)))
+            await self.cache.set_many(embedded)
+            vectors = [vector if vector is not None else embedded[key] for key, vector in zip(keys, vectors)]
+
+        return vectors
+
+    async def embed_one(self, text: str) -> List[float]:
+        return (await self.embed([text]))[0]
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            # Give concurrent callers a moment to join this batch
+            if self.batch_window:
+                await asyncio.sleep(self.batch_window)
+
+            batch = [first]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # Skip requests whose callers have gone away
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+
+            await self._inflight.acquire()
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _embed_batch(self, batch: List[_EmbedRequest]):
+        try:
+            response = await self.client.aio.models.embed_content(
+                model=self.model,
+                contents=[request.text for request in batch],
+                config=types.EmbedContentConfig(output_dimensionality=self.dimensionality)
+            )
+            for request, embedding in zip(batch, response.embeddings):
+                if not request.future.done():
+                    request.future.set_result(embedding.values)
+            logger.debug("embedding_batch_complete", size=len(batch))
+        except Exception as e:
+            logger.error("embedding_batch_failed", size=len(batch), error=str(e))
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            self._inflight.release()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'batches_in_flight': len(self._batch_tasks),
+            'cache': self.cache.stats(),
+        }
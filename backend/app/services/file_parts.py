@@ -0,0 +1,98 @@
+import os
+import time
+import asyncio
+import hashlib
+from fastapi.concurrency import run_in_threadpool
+from google.genai import types
+from app.core.cache import TTLCache
+from app.core.redis import redis_client
+from app.core.logger import logger
+from app.core.config import RAG_INLINE_MAX_BYTES, RAG_FILE_CACHE_SIZE, RAG_FILE_CACHE_TTL
+
+# Gemini deletes uploaded files after 48 hours; handles are dropped an hour before that
+UPLOAD_HANDLE_TTL = 47 * 3600
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+class FilePartCache:
+    """
+    Builds model parts for stored files (RAG hits and attachments) without re-reading them every turn.
+
+    Files up to `inline_max_bytes` are sent inline, and their payloads are kept in a bounded
+    in-process cache validated by mtime and size. Larger files are uploaded once through the
+    Gemini Files API and sent by URI; the upload handle is shared across workers through Redis
+    until shortly before Gemini expires it. If an upload fails, the file is sent inline instead.
+    """
+    def __init__(self, client, inline_max_bytes: int=RAG_INLINE_MAX_BYTES,
+                 maxsize: int=RAG_FILE_CACHE_SIZE, ttl: int=RAG_FILE_CACHE_TTL):
+        self.client = client
+        self.inline_max_bytes = inline_max_bytes
+        self._payloads = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._uploads: dict[str, asyncio.Task] = {}
+        self.disk_reads = 0
+        self.uploads = 0
+
+    async def part(self, path: str, mime_type: str) -> types.Part:
+        stat = await run_in_threadpool(os.stat, path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        if stat.st_size <= self.inline_max_bytes:
+            return types.Part.from_bytes(data=await self._payload(path, version), mime_type=mime_type)
+
+        try:
+            uri = await self._upload_uri(path, mime_type, version)
+            return types.Part.from_uri(file_uri=uri, mime_type=mime_type)
+        except Exception as e:
+            logger.warn("file_upload_failed_sending_inline", path=path, error=str(e))
+            data = await run_in_threadpool(_read_bytes, path)
+            return types.Part.from_bytes(data=data, mime_type=mime_type)
+
+    async def _payload(self, path: str, version: tuple) -> bytes:
+        cached = self._payloads.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        data = await run_in_threadpool(_read_bytes, path)
+        self.disk_reads += 1
+        self._payloads.set(path, (version, data))
+        return data
+
+    async def _upload_uri(self, path: str, mime_type: str, version: tuple) -> str:
+        digest = hashlib.sha256(path.encode('utf-8')).hexdigest()
+        key = f"gemini_file:{digest}:{version[0]}:{version[1]}"
+
+        uri = await redis_client.get(key)
+        if uri:
+            return uri
+
+        # Concurrent requests for the same file in this worker share one upload
+        task = self._uploads.get(key)
+        if task is None:
+            task = asyncio.create_task(self._upload(key, path, mime_type))
+            self._uploads[key] = task
+            task.add_done_callback(lambda _: self._uploads.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _upload(self, key: str, path: str, mime_type: str) -> str:
+        uploaded = await self.client.aio.files.upload(file=path, config=types.UploadFileConfig(mime_type=mime_type))
+        self.uploads += 1
+
+        ttl = UPLOAD_HANDLE_TTL
+        if uploaded.expiration_time:
+            ttl = min(ttl, int(uploaded.expiration_time.timestamp() - time.time()) - 3600)
+        if ttl > 0:
+            await redis_client.set(key, uploaded.uri, ex=ttl)
+
+        logger.info("file_uploaded", path=path, uri=uploaded.uri)
+        return uploaded.uri
+
+    def stats(self) -> dict:
+        return {
+            **self._payloads.stats(),
+            'disk_reads': self.disk_reads,
+            'uploads': self.uploads,
+            'uploads_in_flight': len(self._uploads),
+        }
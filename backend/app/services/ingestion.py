@@ -0,0 +1,194 @@
+import os
+import time
+import uuid
+import shutil
+import asyncio
+from app.core.logger import logger
+from app.core.redis import redis_client
+from app.core.socket import sio
+from app.services.vdb import UnsupportedFileType
+from app.core.config import (
+    STORAGE_PATH, INGEST_MAX_ATTEMPTS, INGEST_LEASE_SECONDS, INGEST_RETRY_BACKOFF, INGEST_CONSUMERS
+)
+
+# ----- REDIS LAYOUT -----
+# ingest:queue          list of job ids waiting to be processed
+# ingest:processing     list of job ids claimed by a consumer
+# ingest:delayed        zset of job ids waiting for a retry, scored by due time
+# ingest:job:{id}       hash with the job's uid, file, status and attempts
+# ingest:lease:{id}     held (and refreshed) while a consumer is working on the job
+
+QUEUE_KEY = "ingest:queue"
+PROCESSING_KEY = "ingest:processing"
+DELAYED_KEY = "ingest:delayed"
+JOB_TTL = 7 * 86400
+
+def _job_key(job_id: str) -> str:
+    return f"ingest:job:{job_id}"
+
+def _lease_key(job_id: str) -> str:
+    return f"ingest:lease:{job_id}"
+
+
+def persist_upload(uid: str, upload_path: str) -> str:
+    """
+    Moves a temporary upload into the user's permanent storage and returns its new path.
+    """
+    user_storage = os.path.join(STORAGE_PATH, uid)
+    os.makedirs(user_storage, exist_ok=True)
+    stored_path = os.path.join(user_storage, os.path.basename(upload_path))
+    shutil.move(upload_path, stored_path)
+    return stored_path
+
+async def enqueue_ingestion(uid: str, file_path: str, file_type: str) -> str:
+    """
+    Queues a stored file for embedding into the knowledge base. Returns the job id.
+    """
+    job_id = str(uuid.uuid4())
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hset(_job_key(job_id), mapping={
+        'uid': uid,
+        'file_path': file_path,
+        'file_type': file_type,
+        'status': 'queued',
+        'attempts': 0,
+        'updated_at': int(time.time()),
+    })
+    pipe.expire(_job_key(job_id), JOB_TTL)
+    pipe.lpush(QUEUE_KEY, job_id)
+    await pipe.execute()
+
+    logger.info("ingest_job_queued", job_id=job_id, user_id=uid, file_path=file_path)
+    await sio.emit('ingestion_queued', {
+        'jobId': job_id,
+        'fileName': os.path.basename(file_path),
+        'status': 'queued',
+    }, room=uid)
+    return job_id
+
+async def get_ingestion_status(job_id: str) -> dict:
+    return await redis_client.hgetall(_job_key(job_id))
+
+
+class IngestionWorker:
+    """
+    Consumes the Redis ingestion queue in the background of every app worker.
+
+    Jobs are claimed atomically (BLMOVE into the processing list) and protected by a lease that
+    the consumer keeps refreshing. Failed jobs are retried with a delay up to INGEST_MAX_ATTEMPTS;
+    jobs whose lease lapsed (their worker died) are put back on the queue by the reaper.
+    Unsupported files fail at once, without retries.
+    The user is notified over socket.io when their file is ready, or has failed for good.
+    """
+    def __init__(self, vdbmanager, consumers: int=INGEST_CONSUMERS):
+        self.vdbmanager = vdbmanager
+        self.consumers = consumers
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.consumers)]
+        self._tasks.append(asyncio.create_task(self._reap()))
+        logger.info("ingest_worker_started", consumers=self.consumers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _consume(self):
+        while True:
+            try:
+                job_id = await redis_client.blmove(QUEUE_KEY, PROCESSING_KEY, timeout=5, src="RIGHT", dest="LEFT")
+                if job_id:
+                    await self._process(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("ingest_consumer_error", error=str(e))
+                await asyncio.sleep(1)
+
+    async def _process(self, job_id: str):
+        await redis_client.set(_lease_key(job_id), "1", ex=INGEST_LEASE_SECONDS)
+        job = await redis_client.hgetall(_job_key(job_id))
+        if not job:
+            # Expired or deleted job
+            await redis_client.lrem(PROCESSING_KEY, 1, job_id)
+            return
+
+        uid = job['uid']
+        struct_logger = logger.bind(job_id=job_id, user_id=uid, file_path=job['file_path'])
+        attempts = await redis_client.hincrby(_job_key(job_id), 'attempts', 1)
+        await redis_client.hset(_job_key(job_id), mapping={'status': 'processing', 'updated_at': int(time.time())})
+
+        heartbeat = asyncio.create_task(self._hold_lease(job_id))
+        try:
+            rows = await self.vdbmanager.ingest_file(uid, job['file_path'], job['file_type'])
+        except UnsupportedFileType as e:
+            struct_logger.warn("ingest_job_unsupported", error=str(e))
+            await self._finish(job_id, job, status='failed', error=str(e))
+            return
+        except Exception as e:
+            struct_logger.error("ingest_job_failed", attempt=attempts, error=str(e))
+            if attempts < INGEST_MAX_ATTEMPTS:
+                await self._retry(job_id, str(e), delay=INGEST_RETRY_BACKOFF * attempts)
+            else:
+                await self._finish(job_id, job, status='failed', error=str(e))
+            return
+        finally:
+            heartbeat.cancel()
+            await redis_client.delete(_lease_key(job_id))
+
+        struct_logger.info("ingest_job_complete", rows=rows)
+        await self._finish(job_id, job, status='done', rows=rows)
+
+    async def _hold_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(INGEST_LEASE_SECONDS / 3)
+            await redis_client.set(_lease_key(job_id), "1", ex=INGEST_LEASE_SECONDS)
+
+    async def _retry(self, job_id: str, error: str, delay: float):
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(_job_key(job_id), mapping={'status': 'retrying', 'error': error, 'updated_at': int(time.time())})
+        pipe.zadd(DELAYED_KEY, {job_id: time.time() + delay})
+        pipe.lrem(PROCESSING_KEY, 1, job_id)
+        await pipe.execute()
+
+    async def _finish(self, job_id: str, job: dict, status: str, rows: int=0, error: str=""):
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(_job_key(job_id), mapping={'status': status, 'rows': rows, 'error': error, 'updated_at': int(time.time())})
+        pipe.lrem(PROCESSING_KEY, 1, job_id)
+        await pipe.execute()
+
+        event = 'ingestion_complete' if status == 'done' else 'ingestion_failed'
+        await sio.emit(event, {
+            'jobId': job_id,
+            'fileName': os.path.basename(job['file_path']),
+            'status': status,
+        }, room=job['uid'])
+
+    async def _reap(self):
+        while True:
+            try:
+                await asyncio.sleep(INGEST_LEASE_SECONDS / 2)
+                now = time.time()
+
+                # Retries that are due go back on the queue
+                for job_id in await redis_client.zrangebyscore(DELAYED_KEY, 0, now):
+                    if await redis_client.zrem(DELAYED_KEY, job_id):
+                        await redis_client.lpush(QUEUE_KEY, job_id)
+
+                # Claimed jobs whose consumer stopped renewing the lease are requeued
+                for job_id in await redis_client.lrange(PROCESSING_KEY, 0, -1):
+                    if await redis_client.exists(_lease_key(job_id)):
+                        continue
+                    updated_at = int(await redis_client.hget(_job_key(job_id), 'updated_at') or 0)
+                    if now - updated_at < INGEST_LEASE_SECONDS:
+                        continue
+                    if await redis_client.lrem(PROCESSING_KEY, 1, job_id):
+                        logger.warn("ingest_job_requeued", job_id=job_id)
+                        await redis_client.lpush(QUEUE_KEY, job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("ingest_reaper_error", error=str(e))
@@ -1,13 +1,15 @@
-import os
+import asyncio
 from google import genai
 from google.genai import types
-import base64
-from typing import List, Dict
+from typing import List, Dict, Callable, Awaitable
 from app.services.tools.handler import GEMINI_TOOLS, GeminiToolHandler, AuthManager
 from app.services.vdb import VDBManager
+from app.services.retrieval import RetrievalPolicy
+from app.services.file_parts import FilePartCache
+from app.services.chat_sessions import ChatSessionPool, TURN_CONTEXT_TAG
 from uuid import UUID
 from app.core.logger import logger
-from app.core.config import GEMINI_API_KEY, TODOIST_API_KEY, LLM_MODEL
+from app.core.config import GEMINI_API_KEY, TODOIST_API_KEY, LLM_MODEL, LLM_REQUEST_TIMEOUT
 
 if not GEMINI_API_KEY:
     raise ValueError("API Key not found! Check your .env file.")
@@ -33,7 +35,8 @@ each task you perform.
     - **Accuracy**: Ensure all event details (time, duration, location) are correct. Confirm these details with the user if they were vague.
 
 2.  **User Preferences**
-    - **Learning**: Pay attention to user habits (e.g., "I never have meetings on Friday afternoons").
+    - **Learning**: Pay attention to user habits (e.g., "I never have meetings on Friday afternoons"). When the user states or reveals a lasting preference, save it with `save_user_preference`.
+    - **Recall**: Preferences relevant to the current message are provided in a "[turn context]" block at the start of the user's message. Rely on it rather than on earlier conversation.
     - **Application**: Proactively apply these preferences. If the user asks for a meeting on Friday afternoon, remind them of their preference: "You usually prefer to keep Friday afternoons free. Should I schedule this anyway?"
 
 3.  **Decision Making & Digression**
@@ -67,14 +70,43 @@ each task you perform.
   You may combine these inline tags (e.g., *_bold and italic_*). Do not use HTML tags or standard Markdown like ** for bold.
 """
 
-# TODO: LLM Client should manage a chat per user, accessed via active chat identifier in user data.
+# Separates text streamed from successive tool-call hops of one turn
+HOP_SEPARATOR = "\n\n"
+
+def _separated(on_chunk):
+    """
+    Wraps a chunk callback so the hop's first chunk is preceded by HOP_SEPARATOR.
+    """
+    first = True
+    async def emit(text: str):
+        nonlocal first
+        if first:
+            first = False
+            text = HOP_SEPARATOR + text
+        await on_chunk(text)
+    return emit
+
+def _chunk_text(chunk: types.GenerateContentResponse) -> str:
+    """
+    Extracts the visible text of a streamed chunk, ignoring function calls and thoughts.
+    """
+    if not chunk.candidates or not chunk.candidates[0].content:
+        return ""
+    return "".join(
+        part.text for part in chunk.candidates[0].content.parts or []
+        if part.text and not part.thought
+    )
+
+
 class LLMClient():
-    def __init__(self, model: str=LLM_MODEL, chat_size_limit: int=100):
+    def __init__(self, model: str=LLM_MODEL, chat_size_limit: int=100, request_timeout: float=LLM_REQUEST_TIMEOUT):
 
         self.client = genai.Client(api_key=GEMINI_API_KEY, http_options=types.HttpOptions(api_version='v1alpha'))
 
         # Initialize Vector Database Client
         self.vdbmanager = VDBManager(llmclient=self.client)
+        self.retrieval = RetrievalPolicy()
+        self.file_parts = FilePartCache(client=self.client)
 
         self.config = types.GenerateContentConfig(
             tools=[
@@ -88,72 +120,125 @@ class LLMClient():
             system_instruction=SYSTEM_INSTRUCTION
         )
 
-        self.chat = self.client.chats.create(model=model, config=self.config)
         self.chat_size_limit = chat_size_limit
-        self.chat_message_len = 0
+        self.request_timeout = request_timeout
+        self.sessions = ChatSessionPool(
+            client=self.client,
+            model=model,
+            config=self.config,
+            chat_size_limit=chat_size_limit
+        )
 
-    async def sendMessage(self, uid: UUID, prompt: str, attachments: List[Dict[str, str]]=None) -> str:
+    async def sendMessage(self, uid: UUID, prompt: str, attachments: List[Dict[str, str]]=None,
+                          on_chunk: Callable[[str], Awaitable[None]]=None) -> str:
+        """
+        Runs one chat turn for the user and returns the model's reply.
+        If on_chunk is given the reply is streamed, and each text chunk is passed to it as it arrives.
+        """
         struct_logger = logger.bind(func_call="sendMessage")
         struct_logger.info("llm_request_received", has_attachments=bool(attachments))
 
         # Initialize tools context per-user request
         auth_manager = AuthManager(uid=uid)
-        tool_handler = GeminiToolHandler(auth_manager)
+        tool_handler = GeminiToolHandler(auth_manager, vdbmanager=self.vdbmanager)
 
         parts = []
         if prompt:
             parts.append(types.Part.from_text(text=prompt))
 
-            filepaths = self.vdbmanager.vdb_search(prompt)
-            for filepath in filepaths:
-                struct_logger.debug("llm_rag_vector_found", filepath=filepath)
-
-                if os.path.exists(filepath):
-                    with open(filepath, 'rb') as file:
-                        content = file.read()
-                    parts.append(types.Part.from_bytes(
-                        data=content,
-                        mime_type=file.get('file_type')
-                    ))
-
-        if attachments:
-            for attachment in attachments:
-                decoded = base64.b64decode(attachment.get('base64'))
-                filepath = self.vdbmanager.save_file(filename=attachment.get('fileName'), content=decoded)
-                self.vdbmanager.embed(filepath=filepath, content=decoded)
-
-                parts.append(types.Part.from_bytes(
-                    data=decoded,
-                    mime_type=attachment.get('mimeType')
-                ))
-
-        if self.chat_message_len > self.chat_size_limit:
-            self.chat = self.client.chats.create(model=model, config=self.config)
-            self.chat_message_len = 0
-
+            # Preferences are cheap and apply to short requests too ("lunch ideas?"),
+            # so only acknowledgements skip them; the knowledge base has the stricter gate
+            if not self.retrieval.is_acknowledgement(prompt):
+                context = await self._preference_context(str(uid), prompt, struct_logger)
+                if context:
+                    parts.insert(0, types.Part.from_text(text=context))
+
+            if self.retrieval.should_retrieve(prompt):
+                hits = self.retrieval.select(await self.vdbmanager.vdb_search(str(uid), prompt))
+                for hit in hits:
+                    struct_logger.debug("llm_rag_vector_found", filepath=hit['file_path'], score=hit['score'])
+                    parts.append(await self.file_parts.part(hit['file_path'], hit['file_type']))
+            else:
+                struct_logger.debug("llm_rag_skipped")
+
+        # Attachments go to the model inline; their knowledge base ingestion runs in the background
+        for attachment in attachments or []:
+            parts.append(await self.file_parts.part(attachment['path'], attachment['mimeType']))
+
+        async with self.sessions.session(uid) as session:
+            text = await self._run_turn(session.chat, parts, tool_handler, struct_logger, on_chunk)
+            session.turns += 1
+
+        return text
+
+    async def _preference_context(self, uid: str, prompt: str, struct_logger) -> str:
+        """
+        Returns a compact block of the user's stored preferences relevant to the prompt, or "" if none apply.
+        """
+        try:
+            preferences = await self.vdbmanager.search_preferences(uid, prompt)
+        except Exception as e:
+            struct_logger.warn("llm_preference_lookup_failed", error=str(e))
+            return ""
+        if not preferences:
+            return ""
+        struct_logger.debug("llm_preferences_injected", count=len(preferences))
+        return "\n".join([f"{TURN_CONTEXT_TAG} Known user preferences:"] + [f"- {text}" for text in preferences])
+
+    async def _send(self, chat, parts, on_chunk: Callable[[str], Awaitable[None]]=None):
+        """
+        Sends a message on the async chat, bounded by the request timeout.
+        Cancelling the caller cancels the in-flight request.
+
+        Returns the response text and the function calls requested by the model.
+        """
+        try:
+            async with asyncio.timeout(self.request_timeout):
+                if not on_chunk:
+                    response = await chat.send_message(parts)
+                    return response.text or "", response.function_calls or []
+
+                text, function_calls = [], []
+                async for chunk in await chat.send_message_stream(parts):
+                    if chunk.function_calls:
+                        function_calls.extend(chunk.function_calls)
+                    chunk_text = _chunk_text(chunk)
+                    if chunk_text:
+                        text.append(chunk_text)
+                        await on_chunk(chunk_text)
+                return "".join(text), function_calls
+        except TimeoutError:
+            logger.error("llm_request_timeout", timeout=self.request_timeout)
+            raise
+
+    async def _run_turn(self, chat, parts, tool_handler: GeminiToolHandler, struct_logger, on_chunk=None) -> str:
+        """
+        Sends the user's parts and resolves tool calls until the model returns text.
+        Returns the final hop's text. When streaming, text from earlier hops (e.g. "Let me check
+        your calendar") was already shown to the user, so all hops are returned, separated.
+        """
         # Handle Tool Calls (Loop until the model returns text)
-        response = self.chat.send_message(parts)
+        text, function_calls = await self._send(chat, parts, on_chunk)
+        turn_text = [text]
 
         status = {
             'status_code': True,
             'errors': []
         }
 
-        while response.function_calls:
-            struct_logger.info("llm_tool_calls_requested", count=len(response.function_calls))
+        while function_calls:
+            struct_logger.info("llm_tool_calls_requested", count=len(function_calls))
             
             # We must collect ALL responses for this turn into a list of parts
             response_parts = []
 
-            for tool_call in response.function_calls:
+            for tool_call in function_calls:
                 struct_logger.info("llm_executing_tool", tool_name=tool_call.name, tool_args=tool_call.args)
-                
-                # Execute the tool
-                result = await tool_handler.handle_tool_call(
-                    tool_call.name, 
-                    tool_call.args
-                )
 
+            # Execute the turn's tools concurrently; results come back in call order
+            results = await tool_handler.handle_tool_calls(function_calls)
+
+            for tool_call, result in zip(function_calls, results):
                 if isinstance(result, dict) and "error" in result:
                     status['status_code'] = False
                     status['errors'].append(f"{tool_call.name}: {result['error']}")
@@ -173,19 +258,21 @@ class LLMClient():
 
             # CHANGE 4: Send ALL tool results back in a single message
             # This satisfies the model's need to see results for all tools it requested
-            response = self.chat.send_message(response_parts)
+            hop_on_chunk = _separated(on_chunk) if on_chunk and any(turn_text) else on_chunk
+            text, function_calls = await self._send(chat, response_parts, hop_on_chunk)
+            turn_text.append(text)
         
         if status['status_code']:
             struct_logger.info("llm_turn_complete")
         else:
             struct_logger.error("llm_turn_failed", errors=status["errors"])
 
-        self.chat_message_len += 1
-        return response.text
+        if on_chunk:
+            return HOP_SEPARATOR.join(hop for hop in turn_text if hop)
+        return text
     
-    def clear_history(self, uid: UUID):
-        self.chat = self.client.chats.create(model=LLM_MODEL, config=self.config)
-        self.chat_message_len = 0
+    async def clear_history(self, uid: UUID):
+        await self.sessions.reset(uid)
         logger.info("llm_history_cleared", user_id=str(uid))
 
 
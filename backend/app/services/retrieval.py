@@ -0,0 +1,64 @@
+import os
+import re
+from typing import List
+from app.core.config import RAG_MIN_SCORE, RAG_MIN_PROMPT_WORDS, RAG_MAX_FILES, RAG_BYTE_BUDGET
+
+_WORDS = re.compile(r"[a-z0-9']+")
+
+# Prompts made only of these words never need the knowledge base
+ACKNOWLEDGEMENTS = frozenset({
+    "ok", "okay", "k", "kk", "yes", "yeah", "yep", "yup", "sure", "no", "nope", "nah",
+    "thanks", "thank", "you", "thx", "ty", "cool", "great", "nice", "perfect", "awesome",
+    "got", "it", "alright", "fine", "good", "sounds", "please", "do", "that", "go", "ahead",
+    "hi", "hello", "hey", "bye", "cheers", "done", "correct", "right", "sorry", "lol",
+})
+
+
+class RetrievalPolicy:
+    """
+    Decides whether a prompt warrants a knowledge base search, and which hits are worth sending.
+
+    Retrieval is skipped for prompts with fewer than `min_prompt_words` words or made only of
+    acknowledgements ("thanks", "yes, go ahead"), saving the embedding call and the search.
+    Hits must reach a cosine similarity of `min_score`, and the files attached in one turn are
+    capped at `max_files` and `byte_budget` bytes in total, best match first.
+    """
+    def __init__(self, min_score: float=RAG_MIN_SCORE, min_prompt_words: int=RAG_MIN_PROMPT_WORDS,
+                 max_files: int=RAG_MAX_FILES, byte_budget: int=RAG_BYTE_BUDGET):
+        self.min_score = min_score
+        self.min_prompt_words = min_prompt_words
+        self.max_files = max_files
+        self.byte_budget = byte_budget
+
+    @staticmethod
+    def is_acknowledgement(prompt: str) -> bool:
+        """
+        Whether a prompt is made only of acknowledgements (or has no words at all).
+        Anything else may benefit from the user's preferences, however short it is.
+        """
+        return all(word in ACKNOWLEDGEMENTS for word in _WORDS.findall((prompt or "").lower()))
+
+    def should_retrieve(self, prompt: str) -> bool:
+        words = _WORDS.findall((prompt or "").lower())
+        if len(words) < self.min_prompt_words:
+            return False
+        return not self.is_acknowledgement(prompt)
+
+    def select(self, hits: List[dict]) -> List[dict]:
+        """
+        Filters search hits ({'file_path', 'file_type', 'score'}) down to the ones to attach.
+        Files that do not fit in the remaining budget are skipped in favour of smaller ones.
+        """
+        selected, remaining = [], self.byte_budget
+        for hit in sorted(hits, key=lambda hit: hit['score'], reverse=True):
+            if hit['score'] < self.min_score or len(selected) == self.max_files:
+                break
+            try:
+                size = os.path.getsize(hit['file_path'])
+            except OSError:
+                continue
+            if size > remaining:
+                continue
+            remaining -= size
+            selected.append({**hit, 'size': size})
+        return selected
@@ -1,4 +1,5 @@
 from .auth_manager import AuthManager
 from .todoist_service import TodoistService
-from .calendar_service import CalendarService
+from .calendar_service import CalendarService, invalidate_calendar_service, calendar_service_cache_stats
+from .preferences_service import PreferenceService
 from .handler import GEMINI_TOOLS, GeminiToolHandler
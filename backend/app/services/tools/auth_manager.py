@@ -15,6 +15,10 @@ class AuthManager:
         self._client_id = client_id or os.getenv("GOOGLE_CLIENT_ID")
         self._client_secret = client_secret or os.getenv("GOOGLE_CLIENT_SECRET")
 
+    @property
+    def uid(self) -> str:
+        return self._uid
+
     def get_todoist_token(self):
         """Returns the Todoist API token."""
         if not self._todoist_token:
@@ -1,30 +1,105 @@
-from googleapiclient.discovery import build
+import json
+import hashlib
+import functools
+import threading
+import httplib2
+import google_auth_httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from app.core.cache import TTLCache
+from app.core.executor import integration_executor
+from app.services.tools.listing_cache import listing_cache
+from app.core.config import GCAL_SERVICE_CACHE_SIZE, GCAL_SERVICE_CACHE_TTL
+
+# One namespace for all of a user's event listings: 'primary' and the calendar's real id name
+# the same calendar, so any event write invalidates every calendar's listings
+EVENTS_NAMESPACE = "gcal_events"
+
+# httplib2 connections are not thread-safe; each executor thread keeps its own
+_thread_local = threading.local()
+
+def _thread_http() -> httplib2.Http:
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = _thread_local.http = httplib2.Http()
+    return http
+
+
+@functools.lru_cache(maxsize=1)
+def _calendar_discovery_document() -> dict:
+    """
+    Parses the bundled Calendar v3 discovery document once per process.
+    """
+    return json.loads(get_static_doc('calendar', 'v3'))
+
+
+# uid -> (credential version, service, credentials)
+_service_cache = TTLCache(maxsize=GCAL_SERVICE_CACHE_SIZE, ttl=GCAL_SERVICE_CACHE_TTL)
+
+def _credential_version(creds) -> str:
+    # Keyed on the grant; access-token refreshes are copied onto the cached credentials instead
+    return hashlib.sha256(f"{creds.refresh_token}".encode()).hexdigest()
+
+def invalidate_calendar_service(uid: str):
+    """
+    Drops the user's cached Calendar service, e.g. after their Google tokens changed or were revoked.
+    """
+    _service_cache.pop(str(uid))
+
+def calendar_service_cache_stats() -> dict:
+    return _service_cache.stats()
+
 
 class CalendarService:
     def __init__(self, auth_manager):
         self.auth_manager = auth_manager
         self.service = None
+        self.creds = None
 
     async def _get_service(self):
         if not self.service:
             creds = await self.auth_manager.get_gcal_credentials_async()
             if not creds:
                 raise Exception("Failed to load Google Calendar credentials")
-            self.service = build('calendar', 'v3', credentials=creds)
+
+            # Reuse the user's service while their stored grant is unchanged
+            uid = str(self.auth_manager.uid)
+            version = _credential_version(creds)
+            cached = _service_cache.get(uid)
+            if cached and cached[0] == version:
+                _, self.service, self.creds = cached
+                self.creds.token = creds.token
+                self.creds.expiry = creds.expiry
+            else:
+                self.creds = creds
+                self.service = build_from_document(_calendar_discovery_document(), credentials=creds)
+                _service_cache.set(uid, (version, self.service, self.creds))
         return self.service
 
+    async def _execute(self, request):
+        """
+        Executes a googleapiclient request on the integration executor instead of the event loop.
+        """
+        def execute():
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=_thread_http())
+            return request.execute(http=http)
+        return await integration_executor.run(execute)
+
     async def list_calendars(self) -> List[Dict[str, Any]]:
         """
         Lists all calendars the user has access to.
         """
-        try:
-            service = await self._get_service()
-            calendar_list = service.calendarList().list().execute()
-            return calendar_list.get('items', [])
-        except Exception as e:
-            return [{"error": str(e)}]
+        async def load():
+            try:
+                service = await self._get_service()
+                calendar_list = await self._execute(service.calendarList().list())
+                return calendar_list.get('items', [])
+            except Exception as e:
+                return [{"error": str(e)}]
+
+        return await listing_cache.get_or_load(self.auth_manager.uid, "gcal_calendars", {}, load)
 
     async def list_events(self, 
                     calendar_id: str = 'primary', 
@@ -35,23 +110,26 @@ class CalendarService:
         """
         Lists events from the specified calendar using the SDK.
         """
-        if not time_min:
-            time_min = datetime.utcnow().isoformat() + 'Z'  # 'Z' indicates UTC time
+        # An omitted time_min means "from now", so it is keyed as omitted; the short TTL bounds the drift
+        args = {'calendar_id': calendar_id, 'time_min': time_min, 'time_max': time_max, 'max_results': max_results, 'query': query}
 
-        try:
-            service = await self._get_service()
-            events_result = service.events().list(
-                calendarId=calendar_id, 
-                timeMin=time_min,
-                timeMax=time_max,
-                maxResults=max_results, 
-                singleEvents=True,
-                orderBy='startTime',
-                q=query
-            ).execute()
-            return events_result.get('items', [])
-        except Exception as e:
-            return [{"error": str(e)}]
+        async def load():
+            try:
+                service = await self._get_service()
+                events_result = await self._execute(service.events().list(
+                    calendarId=calendar_id, 
+                    timeMin=time_min or datetime.utcnow().isoformat() + 'Z',  # 'Z' indicates UTC time
+                    timeMax=time_max,
+                    maxResults=max_results, 
+                    singleEvents=True,
+                    orderBy='startTime',
+                    q=query
+                ))
+                return events_result.get('items', [])
+            except Exception as e:
+                return [{"error": str(e)}]
+
+        return await listing_cache.get_or_load(self.auth_manager.uid, EVENTS_NAMESPACE, args, load)
 
     async def create_event(self, 
                      summary: str, 
@@ -81,7 +159,8 @@ class CalendarService:
             event_body['location'] = location
 
         service = await self._get_service()
-        event = service.events().insert(calendarId=calendar_id, body=event_body).execute()
+        event = await self._execute(service.events().insert(calendarId=calendar_id, body=event_body))
+        await listing_cache.invalidate(self.auth_manager.uid, EVENTS_NAMESPACE)
         return event
         # except Exception as e:
         #     return {"error": str(e)}
@@ -100,7 +179,7 @@ class CalendarService:
         try:
             # First, retrieve the event to get its current state
             service = await self._get_service()
-            event = service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+            event = await self._execute(service.events().get(calendarId=calendar_id, eventId=event_id))
 
             if summary:
                 event['summary'] = summary
@@ -115,7 +194,8 @@ class CalendarService:
                 event['end']['dateTime'] = end_time
                 event['end']['timeZone'] = 'UTC'
 
-            updated_event = service.events().update(calendarId=calendar_id, eventId=event_id, body=event).execute()
+            updated_event = await self._execute(service.events().update(calendarId=calendar_id, eventId=event_id, body=event))
+            await listing_cache.invalidate(self.auth_manager.uid, EVENTS_NAMESPACE)
             return updated_event
         except Exception as e:
             return {"error": str(e)}
@@ -126,7 +206,8 @@ class CalendarService:
         """
         try:
             service = await self._get_service()
-            service.events().delete(calendarId=calendar_id, eventId=event_id).execute()
+            await self._execute(service.events().delete(calendarId=calendar_id, eventId=event_id))
+            await listing_cache.invalidate(self.auth_manager.uid, EVENTS_NAMESPACE)
             return True
         except Exception:
             return False
@@ -1,7 +1,10 @@
 from .auth_manager import AuthManager
 from .todoist_service import TodoistService
 from .calendar_service import CalendarService
+from .preferences_service import PreferenceService
 from app.core.logger import logger
+from app.core.config import TOOL_CALL_TIMEOUT, TOOL_CALL_CONCURRENCY
+import asyncio
 import json
 from datetime import datetime
 from zoneinfo import ZoneInfo
@@ -252,6 +255,25 @@ GCAL_DELETE_EVENT_DECLARATION = {
     }
 }
 
+SAVE_USER_PREFERENCE_DECLARATION = {
+    "name": "save_user_preference",
+    "description": "Saves a lasting preference or habit of the user (e.g. 'No meetings on Friday afternoons'). Use this whenever the user states or reveals a preference worth remembering in future conversations. Restating an existing preference updates it.",
+    "parameters": {
+        "type": "OBJECT",
+        "properties": {
+            "preference": {
+                "type": "STRING",
+                "description": "The preference as one short, self-contained sentence."
+            },
+            "category": {
+                "type": "STRING",
+                "description": "One of 'scheduling', 'tasks', 'communication' or 'general'."
+            }
+        },
+        "required": ["preference"]
+    }
+}
+
 # The list of tools to pass to the Gemini model
 GEMINI_TOOLS = [
     TODOIST_ADD_TASK_DECLARATION,
@@ -263,16 +285,20 @@ GEMINI_TOOLS = [
     TODOIST_UPDATE_TASK_DECLARATION,
     TODOIST_DELETE_TASK_DECLARATION,
     GCAL_UPDATE_EVENT_DECLARATION,
-    GCAL_DELETE_EVENT_DECLARATION
+    GCAL_DELETE_EVENT_DECLARATION,
+    SAVE_USER_PREFERENCE_DECLARATION
 ]
 
 class GeminiToolHandler:
     """
     Handles the execution of tools called by the Gemini model.
     """
-    def __init__(self, auth_manager: AuthManager):
+    def __init__(self, auth_manager: AuthManager, vdbmanager=None, timeout: float=TOOL_CALL_TIMEOUT, concurrency: int=TOOL_CALL_CONCURRENCY):
+        self.timeout = timeout
+        self.concurrency = concurrency
         self.todoist = TodoistService(auth_manager)
         self.gcal = CalendarService(auth_manager)
+        self.preferences = PreferenceService(auth_manager, vdbmanager)
         self.tools_map = {
             "todoist_add_task": self.todoist.add_task,
             "todoist_get_tasks": self.todoist.get_tasks,
@@ -283,7 +309,8 @@ class GeminiToolHandler:
             "todoist_update_task": self.todoist.update_task,
             "todoist_delete_task": self.todoist.delete_task,
             "gcal_update_event": self.gcal.update_event,
-            "gcal_delete_event": self.gcal.delete_event
+            "gcal_delete_event": self.gcal.delete_event,
+            "save_user_preference": self.preferences.save_preference
         }
 
     async def get_current_datetime(self):
@@ -311,6 +338,30 @@ class GeminiToolHandler:
             struct_logger.error("llm_tool_execution_failed", error=str(e), tool_args=tool_args)
             return {"error": str(e)}
 
+    async def handle_tool_calls(self, tool_calls: list) -> list:
+        """
+        Executes all tool calls of a model turn concurrently.
+        At most `concurrency` tools run at once. Each call is bounded by `timeout`, including the
+        time spent waiting for a free slot, so the whole batch finishes within `timeout`.
+        Results are returned in the order of the calls.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def call(tool_call):
+            async with semaphore:
+                return await self.handle_tool_call(tool_call.name, tool_call.args or {})
+
+        async def run(tool_call):
+            try:
+                return await asyncio.wait_for(call(tool_call), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                logger.error("llm_tool_execution_timeout", tool_name=tool_call.name, timeout=self.timeout)
+                return {"error": f"Tool timed out after {self.timeout} seconds"}
+            except Exception as e:
+                return {"error": str(e)}
+
+        return await asyncio.gather(*(run(tool_call) for tool_call in tool_calls))
+
     def process_model_response(self, response):
         """
         Helper to process a response from the Gemini model (if using the Python SDK structure).
@@ -0,0 +1,111 @@
+import json
+import hashlib
+from typing import Any, Awaitable, Callable, Dict
+from app.core.cache import TTLCache
+from app.core.redis import redis_client
+from app.core.logger import logger
+from app.core.config import TOOL_CACHE_TTL, TOOL_CACHE_SIZE
+
+# Generation counters outlive any cached entry by a wide margin
+GENERATION_TTL = 86400
+
+def _is_error(result: Any) -> bool:
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list) and result and isinstance(result[0], dict):
+        return "error" in result[0]
+    return False
+
+
+class ListingCache:
+    """
+    Per-user read-through cache for calendar and task listings.
+
+    Entries are stored in-process and in Redis, keyed by user, namespace (e.g. one calendar's
+    events) and the normalized call arguments. Every key also embeds the namespace's generation
+    counter from Redis; invalidating a namespace bumps the counter, which makes all of its entries
+    unreachable on every worker at once without scanning for keys.
+    """
+    def __init__(self, ttl: int=TOOL_CACHE_TTL, maxsize: int=TOOL_CACHE_SIZE):
+        self.ttl = ttl
+        self._local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _generation_key(uid: str, namespace: str) -> str:
+        return f"tool_cache_gen:{uid}:{namespace}"
+
+    @staticmethod
+    def _normalize(args: Dict[str, Any]) -> str:
+        normalized = {
+            key: value.strip() if isinstance(value, str) else value
+            for key, value in args.items() if value is not None
+        }
+        return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    async def get_or_load(self, uid: str, namespace: str, args: Dict[str, Any], loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Returns the cached listing for these arguments, calling `loader` on a miss.
+        Error results are never cached.
+        """
+        struct_logger = logger.bind(user_id=str(uid), namespace=namespace)
+        try:
+            generation = await redis_client.get(self._generation_key(uid, namespace)) or "0"
+        except Exception as e:
+            struct_logger.warn("tool_cache_unavailable", error=str(e))
+            return await loader()
+
+        key = f"tool_cache:{uid}:{namespace}:{generation}:{self._normalize(args)}"
+
+        result = self._local.get(key)
+        if result is not None:
+            self.local_hits += 1
+            return result
+
+        try:
+            cached = await redis_client.get(key)
+        except Exception as e:
+            struct_logger.warn("tool_cache_read_failed", error=str(e))
+            cached = None
+        if cached is not None:
+            self.redis_hits += 1
+            result = json.loads(cached)
+            self._local.set(key, result)
+            return result
+
+        self.misses += 1
+        result = await loader()
+        if not _is_error(result):
+            self._local.set(key, result)
+            try:
+                await redis_client.set(key, json.dumps(result, default=str), ex=self.ttl)
+            except Exception as e:
+                struct_logger.warn("tool_cache_write_failed", error=str(e))
+        return result
+
+    async def invalidate(self, uid: str, namespace: str):
+        """
+        Invalidates every cached listing of the namespace for the user.
+        """
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.incr(self._generation_key(uid, namespace))
+            pipe.expire(self._generation_key(uid, namespace), GENERATION_TTL)
+            await pipe.execute()
+            logger.debug("tool_cache_invalidated", user_id=str(uid), namespace=namespace)
+        except Exception as e:
+            logger.error("tool_cache_invalidation_failed", user_id=str(uid), namespace=namespace, error=str(e))
+
+    def stats(self) -> dict:
+        return {
+            'ttl': self.ttl,
+            'local_size': len(self._local),
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+        }
+
+
+listing_cache = ListingCache()
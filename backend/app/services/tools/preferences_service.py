@@ -0,0 +1,17 @@
+from typing import Dict, Any
+
+class PreferenceService:
+    def __init__(self, auth_manager, vdbmanager):
+        self.uid = str(auth_manager.uid)
+        self.vdbmanager = vdbmanager
+
+    async def save_preference(self, preference: str, category: str = "general") -> Dict[str, Any]:
+        """
+        Stores a lasting preference or habit of the user, replacing a near-identical stored one.
+        """
+        if self.vdbmanager is None:
+            return {"error": "Preference storage is not available."}
+        try:
+            return await self.vdbmanager.save_preference(self.uid, preference, category)
+        except Exception as e:
+            return {"error": str(e)}
@@ -1,8 +1,13 @@
 from todoist_api_python.api import TodoistAPI
 from typing import List, Optional, Dict, Any
+from app.core.executor import integration_executor
+from app.services.tools.listing_cache import listing_cache
+
+TASKS_NAMESPACE = "todoist_tasks"
 
 class TodoistService:
     def __init__(self, auth_manager):
+        self.uid = auth_manager.uid
         self.token = auth_manager.get_todoist_token()
         self.api = TodoistAPI(self.token)
 
@@ -17,7 +22,8 @@ class TodoistService:
         Creates a new task in Todoist using the SDK.
         """
         try:
-            task = self.api.add_task(
+            task = await integration_executor.run(
+                self.api.add_task,
                 content=content,
                 description=description,
                 due_string=due_string,
@@ -25,6 +31,7 @@ class TodoistService:
                 project_id=project_id,
                 labels=labels
             )
+            await listing_cache.invalidate(self.uid, TASKS_NAMESPACE)
             return task.to_dict()
         except Exception as e:
             return {"error": str(e)}
@@ -33,21 +40,30 @@ class TodoistService:
         """
         Retrieves tasks from Todoist using the SDK.
         """
-        try:
+        def get_tasks():
+            # Iterating the result may page through the API, so it happens off the event loop too
             tasks = self.api.get_tasks(
                 filter=filter_str,
                 project_id=project_id
             )
             return [task.to_dict() for task in tasks]
-        except Exception as e:
-            return [{"error": str(e)}]
+
+        async def load():
+            try:
+                return await integration_executor.run(get_tasks)
+            except Exception as e:
+                return [{"error": str(e)}]
+
+        args = {'filter_str': filter_str, 'project_id': project_id}
+        return await listing_cache.get_or_load(self.uid, TASKS_NAMESPACE, args, load)
 
     async def update_task(self, task_id: str, **kwargs) -> Dict[str, Any]:
         """
         Updates an existing task using the SDK.
         """
         try:
-            is_success = self.api.update_task(task_id=task_id, **kwargs)
+            is_success = await integration_executor.run(self.api.update_task, task_id=task_id, **kwargs)
+            await listing_cache.invalidate(self.uid, TASKS_NAMESPACE)
             if is_success:
                 return {"success": True, "task_id": task_id}
             return {"success": False, "error": "Update failed"}
@@ -59,7 +75,9 @@ class TodoistService:
         Completes a task using the SDK.
         """
         try:
-            return self.api.close_task(task_id=task_id)
+            is_success = await integration_executor.run(self.api.close_task, task_id=task_id)
+            await listing_cache.invalidate(self.uid, TASKS_NAMESPACE)
+            return is_success
         except Exception:
             return False
 
@@ -68,6 +86,8 @@ class TodoistService:
         Deletes a task using the SDK.
         """
         try:
-            return self.api.delete_task(task_id=task_id)
+            is_success = await integration_executor.run(self.api.delete_task, task_id=task_id)
+            await listing_cache.invalidate(self.uid, TASKS_NAMESPACE)
+            return is_success
         except Exception:
             return False
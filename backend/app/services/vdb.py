@@ -1,68 +1,232 @@
 import lancedb
+import pyarrow as pa
 from pypdf import PdfReader
 import os
+import time
+import uuid
+import fcntl
+import asyncio
+from datetime import timedelta
+from fastapi.concurrency import run_in_threadpool
 from google import genai
 from google.genai import types
-from app.core.config import STORAGE_PATH, VDB_DEST
+from app.core.logger import logger
+from app.core.config import VDB_DEST, VDB_READ_CONSISTENCY_SECONDS, VDB_INDEX_INTERVAL, VDB_NPROBES, VDB_REFINE_FACTOR, PREF_TOP_K, PREF_MIN_SCORE, PREF_DEDUPE_SCORE, INGEST_CHUNK_TOKENS, INGEST_CHUNK_OVERLAP, INGEST_EMBED_BATCH
+from app.services.embeddings import EmbeddingService, EMBEDDING_DIM
+from app.services.chunking import Chunker, Chunk
+from app.services.vdb_index import VECTOR_METRIC, ensure_scalar_index, maintain_indexes, index_status
+
+PREFERENCES_SCHEMA = pa.schema([
+    pa.field("vector", pa.list_(pa.float32(), EMBEDDING_DIM)),
+    pa.field("uid", pa.string()),
+    pa.field("id", pa.string()),
+    pa.field("text", pa.string()),
+    pa.field("category", pa.string()),
+    pa.field("updated_at", pa.int64()),
+])
+
+KNOWLEDGE_BASE_SCHEMA = pa.schema([
+    pa.field("vector", pa.list_(pa.float32(), EMBEDDING_DIM)),
+    # Owner of the file; every search is prefiltered to one user's rows
+    pa.field("uid", pa.string()),
+    pa.field("file_path", pa.string()),
+    pa.field("file_type", pa.string()),
+    pa.field("description", pa.string()),
+    # One row per chunk; whole-file rows (images) use chunk 0 with zeroed offsets
+    pa.field("chunk_index", pa.int32()),
+    pa.field("page_start", pa.int32()),
+    pa.field("page_end", pa.int32()),
+    pa.field("char_start", pa.int64()),
+    pa.field("char_end", pa.int64()),
+    pa.field("text", pa.string()),
+])
+
+TEXT_TYPES = (".txt", ".md")
+IMAGE_TYPES = (".jpg", ".png", ".jpeg")
+# Text files have no pages; they are read in blocks of this many characters instead
+TEXT_BLOCK_SIZE = 64 * 1024
+
+
+class UnsupportedFileType(ValueError):
+    """
+    Raised for files the knowledge base cannot ingest. Retrying does not help.
+    """
+
+def is_ingestible(filepath: str) -> bool:
+    return filepath.lower().endswith(IMAGE_TYPES + TEXT_TYPES + ('.pdf',))
+
+# ----- SCHEMA MIGRATIONS -----
+# MIGRATIONS[i] upgrades the database from version i to version i + 1.
+
+def _migrate_v1(vdb):
+    """
+    Replaces the tables that used to be overwritten on every startup (holding only a
+    placeholder row) with persistent, explicitly typed tables.
+    """
+    for name in ("user_preferences", "knowledge_base"):
+        if name in vdb.table_names():
+            vdb.drop_table(name)
+    vdb.create_table("user_preferences", schema=PREFERENCES_SCHEMA)
+    vdb.create_table("knowledge_base", schema=KNOWLEDGE_BASE_SCHEMA)
+
+def _add_missing_columns(table, columns: dict):
+    """
+    Adds each column (name -> SQL default expression) the table does not have yet.
+    Tables created from the current schema already have them, so this is a no-op there.
+    """
+    missing = {name: expr for name, expr in columns.items() if name not in table.schema.names}
+    if missing:
+        table.add_columns(missing)
+
+def _migrate_v2(vdb):
+    """
+    Adds chunk position columns to knowledge_base for per-chunk rows.
+    """
+    _add_missing_columns(vdb.open_table("knowledge_base"), {
+        "chunk_index": "cast(0 as int)",
+        "page_start": "cast(0 as int)",
+        "page_end": "cast(0 as int)",
+        "char_start": "cast(0 as bigint)",
+        "char_end": "cast(0 as bigint)",
+        "text": "cast('' as string)",
+    })
+
+def _migrate_v3(vdb):
+    """
+    Adds the owning user's uid to knowledge_base.
+    Rows ingested before this have no known owner and are left out of every search.
+    """
+    _add_missing_columns(vdb.open_table("knowledge_base"), {
+        "uid": "cast('' as string)",
+    })
+
+def _migrate_v4(vdb):
+    """
+    Adds the owner, a stable id and a timestamp to user_preferences rows.
+    """
+    _add_missing_columns(vdb.open_table("user_preferences"), {
+        "uid": "cast('' as string)",
+        "id": "cast('' as string)",
+        "updated_at": "cast(0 as bigint)",
+    })
+
+MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+]
+
+def _sql_string(value: str) -> str:
+    """
+    Quotes a value for use as a string literal in a LanceDB filter.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
 
 class VDBManager():
     def __init__(self, llmclient, destination: str=VDB_DEST):
          # Initialize / Open Vector Database
-        self.vdb = lancedb.connect(VDB_DEST)
+        self.destination = destination
+        # Other workers write to the same tables (ingestion, preferences); without a consistency
+        # interval an open table handle never sees their commits
+        self.vdb = lancedb.connect(destination, read_consistency_interval=timedelta(seconds=VDB_READ_CONSISTENCY_SECONDS))
         self.llmclient = llmclient
+        self.embeddings = EmbeddingService(client=llmclient)
+
+        # Tables persist across restarts; only pending migrations run
+        self._migrate()
 
         # Vector DB Tables
         # 1. User Preferences Table
-        try:
-            self.pref_table = self.vdb.create_table(
-                "user_preferences",
-                data=[{"vector": [0.0] * 768, "text": "", "category": ""}],
-                mode="overwrite"
-            )
-        except Exception as e:
-            print(e)
-            self.pref_table = self.vdb.open_table("user_preferences")
+        self.pref_table = self.vdb.open_table("user_preferences")
 
         # 2. Knowledge Base Table
+        self.kb_table = self.vdb.open_table("knowledge_base")
+        self._uid_indexed = ensure_scalar_index(self.kb_table, "uid")
+        self._pref_uid_indexed = ensure_scalar_index(self.pref_table, "uid")
+
+    def _version_path(self) -> str:
+        return os.path.join(self.destination, "schema_version")
+
+    def _read_version(self) -> int:
         try:
-            self.kb_table = self.vdb.create_table(
-                "knowledge_base",
-                data=[{"vector": [0.0] * 768, "file_path": "", "file_type": "", "description": ""}],
-                mode="overwrite"
-            )
-        except:
-            self.kb_table = self.vdb.open_table("knowledge_base")
+            with open(self._version_path(), 'r') as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_version(self, version: int):
+        tmp_path = self._version_path() + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(version))
+        os.replace(tmp_path, self._version_path())
+
+    def _migrate(self):
+        """
+        Brings the database up to the latest schema version.
+        Workers starting at the same time serialize on a file lock, so each migration runs exactly once.
+        """
+        os.makedirs(self.destination, exist_ok=True)
+        with open(os.path.join(self.destination, ".migration.lock"), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                version = self._read_version()
+                for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                    logger.info("vdb_migration_start", version=target)
+                    migration(self.vdb)
+                    self._write_version(target)
+                    logger.info("vdb_migration_complete", version=target)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def run_index_maintenance(self, interval: int=VDB_INDEX_INTERVAL):
+        """
+        Background loop that builds, retrains and compacts the ANN indexes as tables grow.
+        Every worker runs it; the shared lock and timestamp make one of them do the work per interval.
+        """
+        while True:
+            try:
+                await run_in_threadpool(maintain_indexes, self.vdb, self.destination, EMBEDDING_DIM, interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("vdb_index_maintenance_failed", error=str(e))
+            await asyncio.sleep(interval)
+
+    async def vector_index_status(self) -> dict:
+        def status():
+            return {
+                'knowledge_base': index_status(self.kb_table),
+                'user_preferences': index_status(self.pref_table),
+            }
+        return await run_in_threadpool(status)
     
 
-    def embed(self, filepath: str=None, content: bytearray | str=None):
+    async def embed(self, filepath: str=None, content: bytearray | str=None):
         """
-        Receives file or text.
-        Returns vector embedding of input using embedding-004 for multimodal vector embedding
+        Receives an image file or text.
+        Returns vector embedding of input using gemini-embedding-001, and a short description of what was embedded.
         """
-        print(f'[VDB-DBG] Received file: {filepath}')
-        image_types = (".jpg", ".png", ".jpeg")
+        struct_logger = logger.bind(filepath=filepath)
+        struct_logger.debug("vdb_embed_received")
         if filepath:
-            if os.path.exists(filepath) and filepath.lower().endswith('.pdf'):
-                # File is PDF, read pdf using PdfReader
-                reader = PdfReader(filepath)
-                text_content = ""
-                for page in reader.pages:
-                    text_content += page.extract_text() + "\n"
-                
-                # Embed file content
-                response = self.llmclient.models.embed_content(
-                    model='gemini-embedding-001',
-                    contents=text_content[:9000],
-                    config=types.EmbedContentConfig(output_dimensionality=768)
-                )
-            
-            elif os.path.exists(filepath) and filepath.lower().endswith(image_types):
-                print(f'Detected file: {filepath} as image')
+            if os.path.exists(filepath) and filepath.lower().endswith(IMAGE_TYPES):
+                struct_logger.debug("vdb_embed_image_detected")
+                text_content = "Image File"
+
+                # Re-uploads of the same image skip the upload, description and embedding calls
+                if content is None:
+                    content = await run_in_threadpool(_read_file, filepath)
+                image_key = self.embeddings.cache.key_for(b"image:" + bytes(content))
+                cached, = await self.embeddings.cache.get_many([image_key])
+                if cached is not None:
+                    return cached, text_content
+
                 # File is an image
-                upload_file = self.llmclient.files.upload(file=filepath)
-                print(upload_file)
-                # We use Gemini 1.5 Flash because it's fast and cheap
-                vision_response = self.llmclient.models.generate_content(
+                upload_file = await self.llmclient.aio.files.upload(file=filepath)
+                # Flash is fast and cheap enough for retrieval descriptions
+                vision_response = await self.llmclient.aio.models.generate_content(
                     model="gemini-2.5-flash",
                     contents=[
                         upload_file,
@@ -71,51 +235,243 @@ class VDBManager():
                 )
                 vision_description = vision_response.text
 
-                response = self.llmclient.models.embed_content(
-                    model='gemini-embedding-001',
-                    contents=vision_description,
-                    config=types.EmbedContentConfig(output_dimensionality=768)
-                )
-                text_content = "Image File"
+                vector = await self.embeddings.embed_one(vision_description)
+                await self.embeddings.cache.set_many({image_key: vector})
+            else:
+                raise ValueError(f"Unsupported file type for embedding: {filepath}")
         
         elif type(content) == str:
             # Content is text
-            response = self.llmclient.models.embed_content(
-                model='gemini-embedding-001',
-                contents=content,
-                config=types.EmbedContentConfig(output_dimensionality=768)
-            )
+            vector = await self.embeddings.embed_one(content)
             text_content = 'Text'
         else:
-            print(f'[VDB-ERR] NO VALID TYPE FOUND FOR FILE: {filepath}\n{content}')
-        return response.embeddings[0].values, text_content
+            struct_logger.error("vdb_embed_invalid_input")
+            raise ValueError(f"No valid type found for embedding: {filepath}")
+        return vector, text_content
+
+
+    async def ingest_file(self, uid: str, filepath: str, filetype: str=None, content: bytes=None) -> int:
+        """
+        Embeds a user's file into the knowledge base and returns the number of rows stored.
+
+        Documents are extracted page by page and split into overlapping chunks, which are embedded
+        and stored in batches of INGEST_EMBED_BATCH, so the whole document text is never held in
+        memory and every part of it is retrievable. Images are stored as a single row.
+
+        Rows previously stored for the same path are replaced, so re-uploads and retried
+        ingestion jobs do not leave duplicates behind.
+        """
+        filetype = filetype or filepath.split('.')[-1]
+        lower = filepath.lower()
+        await self.remove_file(uid, filepath)
+
+        if lower.endswith(IMAGE_TYPES):
+            vector, description = await self.embed(filepath=filepath, content=content)
+            await self.save_vector(uid, vector, filepath, filetype, description)
+            await self._index_uid()
+            return 1
+
+        if lower.endswith('.pdf'):
+            pages = _iter_pdf_pages(filepath)
+        elif lower.endswith(TEXT_TYPES):
+            pages = _iter_text_pages(filepath)
+        else:
+            raise UnsupportedFileType(f"Unsupported file type for ingestion: {filepath}")
+
+        chunker = Chunker(chunk_tokens=INGEST_CHUNK_TOKENS, overlap_tokens=INGEST_CHUNK_OVERLAP)
+        pending: list[Chunk] = []
+        stored = 0
+        while True:
+            # Page extraction is blocking, so each page is pulled off the event loop
+            page = await run_in_threadpool(next, pages, None)
+            if page is None:
+                pending.extend(chunker.finish())
+            else:
+                pending.extend(chunker.add_page(*page))
+
+            while len(pending) >= INGEST_EMBED_BATCH or (page is None and pending):
+                batch, pending = pending[:INGEST_EMBED_BATCH], pending[INGEST_EMBED_BATCH:]
+                stored += await self._store_chunks(uid, filepath, filetype, batch)
+
+            if page is None:
+                break
+
+        await self._index_uid()
+        logger.info("vdb_file_ingested", filepath=filepath, chunks=stored)
+        return stored
+
+    async def _index_uid(self):
+        if not self._uid_indexed:
+            self._uid_indexed = await run_in_threadpool(ensure_scalar_index, self.kb_table, "uid")
+
+    async def remove_file(self, uid: str, filepath: str):
+        """
+        Deletes every knowledge base row stored for a user's file.
+        """
+        await run_in_threadpool(
+            self.kb_table.delete,
+            f"uid = {_sql_string(uid)} AND file_path = {_sql_string(filepath)}"
+        )
+
+    async def _store_chunks(self, uid: str, filepath: str, filetype: str, chunks: list[Chunk]) -> int:
+        vectors = await self.embeddings.embed([chunk.text for chunk in chunks])
+        rows = [{
+            "vector": vector,
+            "uid": uid,
+            "file_path": filepath,
+            "file_type": filetype,
+            "description": chunk.text[:100],
+            "chunk_index": chunk.index,
+            "page_start": chunk.page_start,
+            "page_end": chunk.page_end,
+            "char_start": chunk.char_start,
+            "char_end": chunk.char_end,
+            "text": chunk.text,
+        } for chunk, vector in zip(chunks, vectors)]
+        await run_in_threadpool(self.kb_table.add, rows)
+        return len(rows)
 
 
-    def save_vector(self, vector, filepath: str, filetype: str, description: str=None):
+    async def save_vector(self, uid: str, vector, filepath: str, filetype: str=None, description: str=""):
         # Store in LanceDB
-        self.vdb.kb_table.add([{
+        await run_in_threadpool(self.kb_table.add, [{
             "vector": vector,
+            "uid": uid,
             "file_path": filepath,
-            "file_type": mime if mime else filepath.split('.')[-1],
-            "description": text_content[:100]
+            "file_type": filetype if filetype else filepath.split('.')[-1],
+            "description": (description or "")[:100],
+            "chunk_index": 0,
+            "page_start": 0,
+            "page_end": 0,
+            "char_start": 0,
+            "char_end": 0,
+            "text": description or "",
         }])
-        print(f'[LANCE-EMBED] Embedded file in vector database: {filepath}')
+        logger.info("vdb_file_embedded", filepath=filepath)
 
         return vector
     
     
-    def vdb_search(self, content):
-        # Knowledge base search
-        vector, _ = self.embed(content=content)
-        res = self.kb_table.search(vector).select(['file_path']).limit(3).to_pandas()['file_path'].tolist()
-        print(res)
-        return res 
-    
-    
-    def save_file(self, filename: str=None, content: bytearray=None):
-        filepath = os.path.join(STORAGE_PATH, filename)
+    async def vdb_search(self, uid: str, content, limit: int=3) -> list[dict]:
+        """
+        Knowledge base search over one user's files.
+        Returns up to `limit` distinct files ({'file_path', 'file_type', 'score'}) ranked by their best matching chunk,
+        where score is the chunk's cosine similarity to the query.
+        """
+        vector = await self.embeddings.embed_one(content)
 
-        if filepath:
-            with open(filepath, 'wb') as f:
-                f.write(content)
-        return filepath
\ No newline at end of file
+        def search():
+            # Prefiltering on the indexed uid restricts the scan to this user's rows before ranking.
+            # Over-fetch, since several chunks of one file can rank at the top
+            return (
+                self.kb_table.search(vector)
+                .where(f"uid = {_sql_string(uid)}", prefilter=True)
+                .distance_type(VECTOR_METRIC)
+                .nprobes(VDB_NPROBES)
+                .refine_factor(VDB_REFINE_FACTOR)
+                .select(['file_path', 'file_type'])
+                .limit(limit * 4)
+                .to_list()
+            )
+
+        hits, seen = [], set()
+        for row in await run_in_threadpool(search):
+            if row['file_path'] not in seen:
+                seen.add(row['file_path'])
+                hits.append({
+                    'file_path': row['file_path'],
+                    'file_type': row['file_type'],
+                    'score': 1 - row['_distance'],
+                })
+            if len(hits) == limit:
+                break
+
+        logger.debug("vdb_search_results", results=hits)
+        return hits
+
+    # ----- USER PREFERENCES -----
+
+    def _preference_query(self, uid: str, vector):
+        return (
+            self.pref_table.search(vector)
+            .where(f"uid = {_sql_string(uid)}", prefilter=True)
+            .distance_type(VECTOR_METRIC)
+            .nprobes(VDB_NPROBES)
+            .refine_factor(VDB_REFINE_FACTOR)
+        )
+
+    async def save_preference(self, uid: str, text: str, category: str="general") -> dict:
+        """
+        Stores a preference for the user.
+        A preference at least PREF_DEDUPE_SCORE similar to a stored one replaces it, so restating
+        or refining a preference never accumulates near-duplicates.
+        """
+        vector = await self.embeddings.embed_one(text)
+
+        def nearest():
+            return self._preference_query(uid, vector).select(['id', 'text']).limit(1).to_list()
+
+        existing = await run_in_threadpool(nearest)
+        if existing and 1 - existing[0]['_distance'] >= PREF_DEDUPE_SCORE:
+            pref_id, status = existing[0]['id'], 'updated'
+            await run_in_threadpool(
+                self.pref_table.delete,
+                f"uid = {_sql_string(uid)} AND id = {_sql_string(pref_id)}"
+            )
+        else:
+            pref_id, status = str(uuid.uuid4()), 'saved'
+
+        await run_in_threadpool(self.pref_table.add, [{
+            "vector": vector,
+            "uid": uid,
+            "id": pref_id,
+            "text": text,
+            "category": category or "general",
+            "updated_at": int(time.time()),
+        }])
+        if not self._pref_uid_indexed:
+            self._pref_uid_indexed = await run_in_threadpool(ensure_scalar_index, self.pref_table, "uid")
+
+        logger.info("vdb_preference_stored", user_id=uid, preference_id=pref_id, status=status)
+        return {'id': pref_id, 'status': status}
+
+    async def search_preferences(self, uid: str, content: str, limit: int=PREF_TOP_K) -> list[str]:
+        """
+        Returns the text of the user's preferences most relevant to the content, best first.
+        """
+        vector = await self.embeddings.embed_one(content)
+
+        def search():
+            return self._preference_query(uid, vector).select(['text']).limit(limit).to_list()
+
+        return [row['text'] for row in await run_in_threadpool(search) if 1 - row['_distance'] >= PREF_MIN_SCORE]
+
+
+def _iter_pdf_pages(filepath: str):
+    """
+    Yields (page number, text) one page at a time.
+    """
+    reader = PdfReader(filepath)
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page.extract_text() or ""
+
+def _iter_text_pages(filepath: str, block_size: int=TEXT_BLOCK_SIZE):
+    """
+    Yields (pseudo-page number, text) in blocks of about `block_size` characters, split at
+    line ends, so a large text file is never held in memory whole.
+    A single line longer than the block is split at the block size.
+    """
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        number, lines, size = 1, [], 0
+        while line := f.readline(block_size):
+            lines.append(line)
+            size += len(line)
+            if size >= block_size:
+                yield number, "".join(lines)
+                number, lines, size = number + 1, [], 0
+        if lines or number == 1:
+            yield number, "".join(lines)
+
+def _read_file(filepath: str) -> bytes:
+    with open(filepath, 'rb') as f:
+        return f.read()
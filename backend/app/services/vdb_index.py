@@ -0,0 +1,175 @@
+import os
+import json
+import math
+import time
+import fcntl
+from contextlib import contextmanager
+from app.core.logger import logger
+from app.core.config import VDB_INDEX_MIN_ROWS, VDB_INDEX_INTERVAL, VDB_NPROBES, VDB_REFINE_FACTOR
+
+# Queries and indexes must agree on the metric; Gemini embeddings below 3072 dims are not normalized
+VECTOR_METRIC = "cosine"
+INDEXED_TABLES = ("knowledge_base", "user_preferences")
+
+# ----- INDEX HELPERS -----
+
+def _find_index(table, column: str):
+    return next((index for index in table.list_indices() if index.columns == [column]), None)
+
+def ensure_scalar_index(table, column: str) -> bool:
+    """
+    Creates a scalar index on a filter column (e.g. uid) so prefilters do not scan the table.
+    Lance cannot index an empty table, so this is retried once the table has rows.
+    Returns whether the index exists.
+    """
+    if _find_index(table, column):
+        return True
+    if table.count_rows() == 0:
+        return False
+    table.create_scalar_index(column, replace=True)
+    logger.info("vdb_scalar_index_created", table=table.name, column=column)
+    return True
+
+def _trained_rows_path(destination: str) -> str:
+    return os.path.join(destination, ".index_trained.json")
+
+def _read_trained_rows(destination: str) -> dict:
+    try:
+        with open(_trained_rows_path(destination)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _record_trained_rows(destination: str, name: str, rows: int):
+    """
+    Remembers how many rows a table's vector index was trained on. The index's own
+    num_indexed_rows cannot tell: optimize() adds new rows to it without retraining.
+    """
+    trained = _read_trained_rows(destination)
+    trained[name] = rows
+    with open(_trained_rows_path(destination), 'w') as f:
+        json.dump(trained, f)
+
+def build_vector_index(table, embedding_dim: int, destination: str | None=None):
+    """
+    (Re)trains an IVF_PQ index over the table's current rows.
+    Partitions grow with the square root of the row count; sub-vectors of 16 dims keep PQ codes small.
+    With a `destination`, the training row count is recorded for maintain_table().
+    """
+    rows = table.count_rows()
+    num_partitions = max(1, min(256, int(math.sqrt(rows))))
+    table.create_index(
+        metric=VECTOR_METRIC,
+        vector_column_name="vector",
+        index_type="IVF_PQ",
+        num_partitions=num_partitions,
+        num_sub_vectors=embedding_dim // 16,
+        replace=True,
+    )
+    if destination:
+        _record_trained_rows(destination, table.name, rows)
+    logger.info("vdb_vector_index_built", table=table.name, rows=rows, partitions=num_partitions)
+
+def maintain_table(table, destination: str, embedding_dim: int, min_rows: int=VDB_INDEX_MIN_ROWS) -> str:
+    """
+    Brings one table's indexes up to date and returns the action taken.
+
+    - No vector index and at least `min_rows` rows: build one.
+    - Table more than doubled since the index was trained: retrain it, since the partition
+      centroids no longer fit the data.
+    - Otherwise: optimize, which compacts small append fragments and folds new rows into the
+      existing indexes incrementally.
+    """
+    rows = table.count_rows()
+    index = _find_index(table, "vector")
+
+    if index is None:
+        if rows >= min_rows:
+            build_vector_index(table, embedding_dim, destination)
+            return "built"
+    else:
+        trained_rows = _read_trained_rows(destination).get(table.name)
+        if trained_rows is None:
+            # Index trained before row counts were recorded; what it holds now is the best baseline
+            stats = table.index_stats(index.name)
+            trained_rows = stats.num_indexed_rows if stats else rows
+            _record_trained_rows(destination, table.name, trained_rows)
+        if rows > 2 * trained_rows:
+            build_vector_index(table, embedding_dim, destination)
+            return "rebuilt"
+
+    table.optimize()
+    return "optimized"
+
+def index_status(table) -> dict:
+    """
+    Reports a table's row count, its indexes and the recall settings searches use.
+    """
+    indexes = []
+    for index in table.list_indices():
+        stats = table.index_stats(index.name)
+        indexes.append({
+            'name': index.name,
+            'type': str(index.index_type),
+            'columns': list(index.columns),
+            'indexed_rows': stats.num_indexed_rows if stats else None,
+            'unindexed_rows': stats.num_unindexed_rows if stats else None,
+        })
+    return {
+        'rows': table.count_rows(),
+        'version': table.version,
+        'indexes': indexes,
+        'metric': VECTOR_METRIC,
+        'nprobes': VDB_NPROBES,
+        'refine_factor': VDB_REFINE_FACTOR,
+    }
+
+# ----- MAINTENANCE -----
+
+@contextmanager
+def maintenance_lock(destination: str):
+    """
+    Non-blocking file lock shared by all workers. Yields whether this process holds it;
+    a worker that finds it held skips the run rather than queueing behind it.
+    """
+    os.makedirs(destination, exist_ok=True)
+    with open(os.path.join(destination, ".index.lock"), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _stamp_path(destination: str) -> str:
+    return os.path.join(destination, ".index_maintenance")
+
+def maintain_indexes(vdb, destination: str, embedding_dim: int, interval: int=VDB_INDEX_INTERVAL, force: bool=False) -> dict:
+    """
+    Maintains every indexed table, at most once per `interval` across all workers.
+    Returns the action taken per table (empty if the run was skipped).
+    """
+    with maintenance_lock(destination) as acquired:
+        if not acquired:
+            return {}
+
+        try:
+            last_run = os.path.getmtime(_stamp_path(destination))
+        except FileNotFoundError:
+            last_run = 0
+        if not force and time.time() - last_run < interval:
+            return {}
+
+        actions = {}
+        for name in INDEXED_TABLES:
+            table = vdb.open_table(name)
+            actions[name] = maintain_table(table, destination, embedding_dim)
+            ensure_scalar_index(table, "uid")
+
+        with open(_stamp_path(destination), 'w') as stamp:
+            stamp.write(str(int(time.time())))
+        logger.info("vdb_index_maintenance_complete", actions=actions)
+        return actions
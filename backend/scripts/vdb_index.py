@@ -0,0 +1,52 @@
+"""
+Inspect and maintain the vector database indexes.
+
+Usage (from backend/):
+    python scripts/vdb_index.py status
+    python scripts/vdb_index.py reindex [--table knowledge_base]
+    python scripts/vdb_index.py optimize
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lancedb
+from app.core.config import VDB_DEST
+from app.services.embeddings import EMBEDDING_DIM
+from app.services.vdb_index import INDEXED_TABLES, index_status, build_vector_index, maintain_indexes, maintenance_lock
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector index status and maintenance")
+    parser.add_argument("command", choices=["status", "reindex", "optimize"])
+    parser.add_argument("--table", choices=INDEXED_TABLES, help="Limit to one table")
+    args = parser.parse_args()
+
+    vdb = lancedb.connect(VDB_DEST)
+    tables = [args.table] if args.table else list(INDEXED_TABLES)
+
+    if args.command == "status":
+        print(json.dumps({name: index_status(vdb.open_table(name)) for name in tables}, indent=2))
+
+    elif args.command == "reindex":
+        with maintenance_lock(VDB_DEST) as acquired:
+            if not acquired:
+                sys.exit("Index maintenance is already running, try again later.")
+            for name in tables:
+                table = vdb.open_table(name)
+                if table.count_rows() == 0:
+                    print(f"{name}: empty, skipped")
+                    continue
+                build_vector_index(table, EMBEDDING_DIM, VDB_DEST)
+                print(f"{name}: rebuilt")
+
+    elif args.command == "optimize":
+        actions = maintain_indexes(vdb, VDB_DEST, EMBEDDING_DIM, force=True)
+        if not actions:
+            sys.exit("Index maintenance is already running, try again later.")
+        print(json.dumps(actions, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from unittest.mock import patch
+from app.core.cache import TTLCache
+
+
+def test_lru_eviction():
+    """
+    Tests that the least recently used entry is evicted once maxsize is reached.
+    """
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_entries_expire():
+    """
+    Tests that entries expire after their TTL and count as misses.
+    """
+    cache = TTLCache(maxsize=4, ttl=10)
+    with patch("app.core.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.core.cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+
+    assert cache.stats()["misses"] == 1
+    assert len(cache) == 0
+
+
+def test_sliding_expiry_extends_on_hit():
+    """
+    Tests that sliding entries stay alive while they keep being accessed.
+    """
+    cache = TTLCache(maxsize=4, ttl=10, sliding=True)
+    with patch("app.core.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.core.cache.time.monotonic", return_value=108.0):
+        assert cache.get("a") == 1
+    with patch("app.core.cache.time.monotonic", return_value=116.0):
+        assert cache.get("a") == 1
+        assert cache.purge_expired() == 0
@@ -0,0 +1,56 @@
+import pytest
+from app.services.chunking import Chunker
+
+
+def chunk_document(pages, **kwargs):
+    chunker = Chunker(**kwargs)
+    chunks = []
+    for page, text in enumerate(pages, start=1):
+        chunks.extend(chunker.add_page(page, text))
+    chunks.extend(chunker.finish())
+    return chunks
+
+
+def test_short_document_is_one_chunk():
+    """
+    Tests that a document below the chunk size produces a single chunk.
+    """
+    chunks = chunk_document(["hello world"], chunk_tokens=50, overlap_tokens=10)
+
+    assert len(chunks) == 1
+    assert chunks[0].text == "hello world"
+    assert (chunks[0].page_start, chunks[0].page_end) == (1, 1)
+    assert (chunks[0].char_start, chunks[0].char_end) == (0, 11)
+
+
+def test_chunks_overlap_and_span_pages():
+    """
+    Tests that consecutive chunks share their boundary words and track page ranges.
+    """
+    page_one = " ".join(f"a{i:03d}" for i in range(30))
+    page_two = " ".join(f"b{i:03d}" for i in range(30))
+    chunks = chunk_document([page_one, page_two], chunk_tokens=20, overlap_tokens=4)
+
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.text.split()[-1] in current.text.split()
+
+    assert any(chunk.page_start == 1 and chunk.page_end == 2 for chunk in chunks)
+    assert chunks[-1].text.split()[-1] == "b029"
+
+
+def test_offsets_point_into_document():
+    """
+    Tests that chunk offsets index into the newline-joined document text.
+    """
+    pages = ["first page text here", "second page text"]
+    document = "\n".join(pages)
+    chunks = chunk_document(pages, chunk_tokens=3, overlap_tokens=1)
+
+    for chunk in chunks:
+        assert document[chunk.char_start:chunk.char_end].split() == chunk.text.split()
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        Chunker(chunk_tokens=10, overlap_tokens=10)
@@ -0,0 +1,25 @@
+import time
+import asyncio
+import pytest
+from app.core.executor import BoundedExecutor
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_keeps_slot_until_thread_finishes():
+    """
+    Tests that cancelling the awaiting coroutine does not free the slot of a call still running.
+    """
+    executor = BoundedExecutor("test", max_workers=1, max_pending=0)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(executor.run(time.sleep, 0.3), timeout=0.05)
+
+        assert executor.stats()['in_flight'] == 1
+        assert executor._slots.locked()
+
+        # The next call waits for the abandoned one instead of queueing behind it unbounded
+        assert await executor.run(lambda: "done") == "done"
+        assert executor.stats()['in_flight'] == 0
+        assert executor.stats()['completed'] == 2
+    finally:
+        executor.shutdown()
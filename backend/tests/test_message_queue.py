@@ -0,0 +1,126 @@
+import pytest
+from types import SimpleNamespace
+from app.db.manager import DBManager
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeMessageQueue:
+    """
+    In-memory stand-in for the message_queue collection, supporting the queries DBManager issues.
+    """
+    def __init__(self):
+        self.docs = []
+
+    @staticmethod
+    def _matches(doc, query):
+        if doc['uid'] != query['uid']:
+            return False
+        if 'seq' not in query:
+            return True
+        if '$in' in query['seq']:
+            return doc['seq'] in query['seq']['$in']
+        return doc['seq'] <= query['seq']['$lte']
+
+    async def insert_one(self, doc):
+        self.docs.append(dict(doc))
+
+    async def delete_many(self, query):
+        kept = [doc for doc in self.docs if not self._matches(doc, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    def find(self, query, projection=None):
+        return FakeCursor([
+            {'seq': doc['seq'], 'message': doc['message']}
+            for doc in self.docs if self._matches(doc, query)
+        ])
+
+
+class FakeCounters:
+    def __init__(self):
+        self.values = {}
+
+    async def find_one_and_update(self, query, update, **kwargs):
+        self.values[query['_id']] = self.values.get(query['_id'], 0) + update['$inc']['seq']
+        return {'seq': self.values[query['_id']]}
+
+
+class FakeUsers:
+    async def find_one_and_update(self, query, update, **kwargs):
+        # No legacy messageQueue field to drain
+        return None
+
+
+@pytest.fixture
+def db():
+    manager = DBManager.__new__(DBManager)
+    manager.message_queue = FakeMessageQueue()
+    manager.counters = FakeCounters()
+    manager.users = FakeUsers()
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_unacknowledged_messages_are_redelivered(db):
+    """
+    Tests that fetched messages stay queued until acknowledged, so a dropped delivery is retried.
+    """
+    for text in ("first", "second"):
+        assert await db.insertMessageQueue("user-1", {'message': text})
+
+    # Delivery is interrupted before the client acknowledges
+    delivered = await db.fetchMessageQueue("user-1")
+    assert [entry['message']['message'] for entry in delivered] == ["first", "second"]
+
+    redelivered = await db.fetchMessageQueue("user-1")
+    assert redelivered == delivered
+
+
+@pytest.mark.asyncio
+async def test_ack_removes_only_delivered_messages(db):
+    """
+    Tests that acknowledging the delivered messages keeps messages queued after the fetch.
+    """
+    for text in ("first", "second"):
+        await db.insertMessageQueue("user-1", {'message': text})
+    delivered = await db.fetchMessageQueue("user-1")
+
+    # A message arrives between the fetch and the acknowledgement
+    await db.insertMessageQueue("user-1", {'message': "third"})
+    assert await db.ackMessageQueue("user-1", [entry['seq'] for entry in delivered]) == 2
+
+    remaining = await db.fetchMessageQueue("user-1")
+    assert [entry['message']['message'] for entry in remaining] == ["third"]
+
+
+@pytest.mark.asyncio
+async def test_ack_keeps_message_inserted_late_with_lower_seq(db):
+    """
+    Tests that a message whose seq was allocated before a delivered one, but inserted after
+    the fetch, is not removed by the acknowledgement.
+    """
+    late_seq = await db._next_message_seq("user-1")
+    await db.insertMessageQueue("user-1", {'message': "second"})
+    delivered = await db.fetchMessageQueue("user-1")
+
+    # The slower insert lands after the fetch
+    await db.message_queue.insert_one({'uid': "user-1", 'seq': late_seq, 'message': {'message': "first"}})
+    await db.ackMessageQueue("user-1", [entry['seq'] for entry in delivered])
+
+    remaining = await db.fetchMessageQueue("user-1")
+    assert [entry['seq'] for entry in remaining] == [late_seq]
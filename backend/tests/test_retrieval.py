@@ -0,0 +1,42 @@
+from app.services.retrieval import RetrievalPolicy
+
+
+def test_skips_trivial_prompts():
+    """
+    Tests that short and acknowledgement-only prompts do not trigger retrieval.
+    """
+    policy = RetrievalPolicy(min_prompt_words=3)
+
+    assert not policy.should_retrieve("thanks")
+    assert not policy.should_retrieve("Yes, go ahead!")
+    assert not policy.should_retrieve("ok thank you")
+    assert policy.should_retrieve("What did the lease say about pets?")
+
+
+def test_short_requests_are_not_acknowledgements():
+    """
+    Tests that short requests still get preferences even though they skip retrieval.
+    """
+    policy = RetrievalPolicy(min_prompt_words=3)
+
+    assert policy.is_acknowledgement("Thanks, sounds good!")
+    assert not policy.is_acknowledgement("lunch ideas?")
+    assert not policy.should_retrieve("lunch ideas?")
+
+
+def test_select_applies_threshold_and_budget(tmp_path):
+    """
+    Tests that weak hits are dropped and attached files stay within the byte budget.
+    """
+    sizes = {"big.txt": 800, "small.txt": 100, "medium.txt": 300, "weak.txt": 10}
+    hits = []
+    for (name, size), score in zip(sizes.items(), [0.95, 0.9, 0.85, 0.3]):
+        path = tmp_path / name
+        path.write_bytes(b"x" * size)
+        hits.append({'file_path': str(path), 'file_type': 'text/plain', 'score': score})
+
+    policy = RetrievalPolicy(min_score=0.5, max_files=3, byte_budget=1000)
+    selected = [hit['file_path'].split('/')[-1] for hit in policy.select(hits)]
+
+    # medium.txt no longer fits after big.txt, and weak.txt is below the threshold
+    assert selected == ["big.txt", "small.txt"]
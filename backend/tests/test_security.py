@@ -0,0 +1,64 @@
+import time
+import hashlib
+import jwt
+import pytest
+from unittest.mock import patch
+from app.core import security
+from app.core.config import JWT_SECRET_KEY, JWT_ALGORITHM
+from app.core.security import create_access_token, create_refresh_token, verify_token
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    security._verified_tokens.clear()
+    yield
+    security._verified_tokens.clear()
+
+
+def test_cached_token_skips_signature_check():
+    """
+    Tests that a token verified once is served from the cache afterwards.
+    """
+    token = create_access_token("user-1")
+    assert verify_token(token).sub == "user-1"
+
+    with patch("app.core.security.jwt.decode", side_effect=AssertionError("signature checked again")):
+        payload = verify_token(token)
+
+    assert payload.sub == "user-1"
+    assert payload.type == "access"
+
+
+def test_expired_cached_token_is_rejected():
+    """
+    Tests that a cache entry whose token has expired is not trusted.
+    """
+    exp = int(time.time()) - 5
+    token = jwt.encode({"sub": "user-1", "exp": exp, "type": "access"}, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    security._verified_tokens.set(key, ("user-1", exp, "access"), ttl=60)
+
+    with pytest.raises(ValueError, match="expired"):
+        verify_token(token)
+
+
+def test_cached_token_of_wrong_type_is_rejected():
+    """
+    Tests that a cached access token is still rejected where a refresh token is expected.
+    """
+    token = create_access_token("user-1")
+    assert verify_token(token).sub == "user-1"
+
+    with patch("app.core.security.jwt.decode", side_effect=AssertionError("signature checked again")):
+        with pytest.raises(ValueError, match="Invalid token type"):
+            verify_token(token, expected_type="refresh")
+
+
+def test_refresh_tokens_are_not_cached():
+    """
+    Tests that refresh tokens are verified in full on every use.
+    """
+    token = create_refresh_token("user-1")
+    assert verify_token(token, expected_type="refresh").sub == "user-1"
+
+    assert len(security._verified_tokens) == 0
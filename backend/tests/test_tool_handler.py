@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from app.services.tools import GeminiToolHandler
+
+
+def make_handler(concurrency: int=4, **tools) -> GeminiToolHandler:
+    handler = GeminiToolHandler(MagicMock(), timeout=0.2, concurrency=concurrency)
+    handler.tools_map = dict(tools)
+    return handler
+
+def call(name: str, **args):
+    return SimpleNamespace(name=name, args=args)
+
+
+@pytest.mark.asyncio
+async def test_results_follow_call_order():
+    """
+    Tests that results come back in the order of the calls, not the order they finish in.
+    """
+    async def echo(value, delay):
+        await asyncio.sleep(delay)
+        return {"value": value}
+
+    handler = make_handler(echo=echo)
+    results = await handler.handle_tool_calls([
+        call("echo", value=1, delay=0.05),
+        call("echo", value=2, delay=0),
+        call("echo", value=3, delay=0.02),
+    ])
+
+    assert results == [{"value": 1}, {"value": 2}, {"value": 3}]
+
+
+@pytest.mark.asyncio
+async def test_slow_tool_times_out_alone():
+    """
+    Tests that a tool exceeding the timeout returns an error result without failing the others.
+    """
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def quick():
+        return {"ok": True}
+
+    handler = make_handler(hang=hang, quick=quick)
+    results = await handler.handle_tool_calls([call("hang"), call("quick")])
+
+    assert results == [{"error": "Tool timed out after 0.2 seconds"}, {"ok": True}]
+
+
+@pytest.mark.asyncio
+async def test_timeout_includes_waiting_for_a_slot():
+    """
+    Tests that time spent queued behind other tools counts against the timeout.
+    """
+    async def slow():
+        await asyncio.sleep(0.15)
+        return {"ok": True}
+
+    handler = make_handler(concurrency=1, slow=slow)
+    results = await handler.handle_tool_calls([call("slow"), call("slow")])
+
+    assert results == [{"ok": True}, {"error": "Tool timed out after 0.2 seconds"}]